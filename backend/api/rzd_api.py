@@ -27,10 +27,15 @@ GET /routes?code_from={c1}&code_to={c2}
         "route": "МОСКВА - СПБ",
         "ts_dep": "2023-10-27T23:30:00",
         "ts_arr": "2023-10-28T08:15:00",
-        "is_express": false
+        "is_express": false,
+        "incomplete": false
         }
-    ]
+    ],
+    "incomplete": false
     }
+    Ответ приходит не позже чем через `routes_budget` сек: поезда, чей настоящий
+    маршрут ещё не найден, идут с fallback_route и "incomplete": true
+    (поиск продолжается в фоне - повторный запрос вернёт полные данные).
 
 GET /station_list?train_num={n}&code_from={c1}&code_to={c2}
 -----------------------------------------------------------
@@ -46,25 +51,42 @@ GET /station_list?train_num={n}&code_from={c1}&code_to={c2}
         "ts_arr": "2023-10-28T01:15:00",
         "ts_dep": "2025-11-28T04:09:30",
         "stop_min": 1,
-        "is_target": false
+        "is_target": null
         }
-    ]
+    ],
+    "segment": [3, 17]
     }
+    is_target: 0 - станция A, 1 - станция B; segment - индексы A и B в stops (null, если их нет).
+    Маршрут поезда кэшируется один на поезд и день, пара станций на него не влияет.
+    Неудачный поиск маршрута кэшируется ненадолго (ROUTE_RETRY), а не на CACHE_TTL.
 """
 
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 import httpx
-from fastapi import APIRouter
+from fastapi import (APIRouter, Request, Response)
 from aiocache import cached, Cache
 
+from backend.tools.metrics import upstream_hooks
+from backend.tools.flight import (single_flight, until_disconnected, upstream_call, ClientDisconnected)
+from backend.tools.delays import delay_recorder
+from backend.api.rzd_decode import (decode_prices, decode_departed, decode_route_stops, train_base, field,
+                                    roll_stop_times)
+from backend.tools.log import get_logger
+from backend.tools.cache import TTLCache
+from backend.tools.constant import ROUTES_BUDGET
+
 rzd_api = APIRouter()
+log = get_logger("rzd")
 
 # Настройки
 TIMEOUT = 30
 CACHE_TTL = 600
+ROUTE_RETRY = 30 # сек: столько не повторяем неудачный поиск маршрута
+CLIENT_GONE = 499 # как у nginx: клиент закрыл соединение, ответ уже никто не прочитает
+ROUTES_MIN_WAIT = 0.05 # даже если бюджет съели PRICES/DEPARTED - маршруты из кэша успеют
 URLS = {
     "SUGGEST": "https://ticket.rzd.ru/api/v1/suggests",
     "ROUTE": "https://ticket.rzd.ru/apib2b/p/Railway/V1/Search/TrainRoute",
@@ -72,15 +94,41 @@ URLS = {
     "DEPARTED": "https://ticket.rzd.ru/api/v1/railway/departed",
 }
 
-client = httpx.AsyncClient(timeout=TIMEOUT)
+# закрывается в lifespan (main.py)
+client = httpx.AsyncClient(timeout=TIMEOUT, event_hooks=upstream_hooks())
+
+_routes_cache = TTLCache(4096, 300) # только полные ответы /routes
+_background = set() # поиски маршрутов, переживающие свой запрос
+_routes_stats = {"complete": 0, "partial": 0, "cached": 0, "late_lookups": 0}
+
+
+def routes_stats() -> dict:
+    return {**_routes_stats, "background": len(_background)}
 
 
+async def stop_background():
+    """🛑 Отменяет фоновые поиски маршрутов и ждёт их. Вызывать до `client.aclose()`."""
+    tasks = list(_background)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _upstream(kind: str, method: str, **kwargs) -> httpx.Response:
+    """Запрос к RZD; отменённые (клиент ушёл) считаются в /stats"""
+    with upstream_call(kind):
+        return await client.request(method, URLS[kind], **kwargs)
+
+
+# single_flight над cached: одинаковые запросы ждут одну задачу, а задача,
+# которая больше никому не нужна, отменяется вместе с запросами к RZD
+@single_flight("stations")
 @cached(ttl=CACHE_TTL, cache=Cache.MEMORY)
 async def _fetch_stations_data(query: str) -> List[Dict]:
     """Ищем станции по названию."""
     params = {'Query': query, 'TransportType': 'rail', 'GroupResults': 'true'}
     try:
-        resp = await client.get(URLS["SUGGEST"], params=params)
+        resp = await _upstream("SUGGEST", "GET", params=params)
         resp.raise_for_status()
         q_upper = query.upper()
         return [
@@ -92,155 +140,195 @@ async def _fetch_stations_data(query: str) -> List[Dict]:
         return []
     
 
-def normalize_time(time_str: str) -> str:
-    """Нормализует время к формату HH:MM:SS."""
-    parts = time_str.split(':')
-    if len(parts) == 2:
-        return f"{time_str}:00"
-    return time_str
+def _or_na(value):
+    return "Н/Д" if value is None else value
 
 
-@cached(ttl=CACHE_TTL, cache=Cache.MEMORY)
-async def _fetch_stops_data(number: str, c0: str, c1: str, p: str, s: str) -> Dict:
-    """Получаем остановки для конкретного поезда."""
+class TrainRoute(NamedTuple):
+    """
+    🚆 Весь маршрут поезда за день - один на все пары станций \n
+    Параллельные кортежи вместо dict на каждую остановку; вид для конкретной
+    пары A-B (is_target, отрезок) собирается из него при чтении.
+    """
+    names: Tuple[str, ...]
+    codes: Tuple[Any, ...] # как пришли от RZD - так и отдаём
+    code_ints: Tuple[Optional[int], ...] # для сравнения с кодами станций пары
+    ts_arr: Tuple[str, ...]
+    ts_dep: Tuple[str, ...]
+    stop_min: Tuple[Any, ...]
+
+
+EMPTY_ROUTE = TrainRoute((), (), (), (), (), ())
+_route_failures = TTLCache(4096, ROUTE_RETRY) # ключ поезда -> True (маршрут недавно не нашёлся)
+
+
+class RouteUnavailable(Exception):
+    """RZD не отдал маршрут - наружу из кэшируемой функции, чтобы пустой ответ не лёг в кэш"""
+
+
+def _route_key(number: str, c0: str, c1: str, p: str, s: str, day: date) -> tuple:
+    # от пары станций ответ TrainRoute не зависит - в ключе её нет
+    return number, p, s, day
+
+
+@single_flight("train_route", key=_route_key)
+@cached(ttl=CACHE_TTL, cache=Cache.MEMORY, key_builder=lambda f, *args, **kwargs: f"train_route{_route_key(*args)}")
+async def _fetch_train_route(number: str, c0: str, c1: str, p: str, s: str, day: date) -> TrainRoute:
+    """Весь маршрут поезда: один запрос к RZD на поезд и день (c0/c1 нужны только самому RZD)."""
     params = {
         "TrainNumber": number, "Origin": c0, "Destination": c1,
-        "DepartureDate": datetime.now().isoformat(),
+        "DepartureDate": datetime.combine(day, time()).isoformat(), # тот же день, что в ключе кэша
         "Provider": p, "serviceProvider": s
     }
     try:
-        resp = await client.get(URLS["ROUTE"], params=params)
+        resp = await _upstream("ROUTE", "GET", params=params)
         resp.raise_for_status()
-        data = resp.json()
-        stops_data = data.get("Routes", [{}])[0].get("RouteStops", [])
-    except (httpx.HTTPError, KeyError, IndexError, ValueError):
-        return {"train": number, "stops": []}
+        stops_data = decode_route_stops(resp.content)
+        # время всех остановок разом, с переходом через полночь
+        times = roll_stop_times(((field(st, "ArrivalTime"), field(st, "DepartureTime")) for st in stops_data), day)
+    except (httpx.HTTPError, KeyError, IndexError, ValueError) as e:
+        raise RouteUnavailable(number) from e
+    if not stops_data:
+        raise RouteUnavailable(number)
+
+    codes = tuple(field(stop, "StationCode") for stop in stops_data)
+    return TrainRoute(
+        names=tuple(_or_na(field(stop, "StationName")) for stop in stops_data),
+        codes=tuple(_or_na(code) for code in codes),
+        code_ints=tuple(int(code) if code else None for code in codes),
+        ts_arr=tuple(arr.isoformat() if arr else "Н/Д" for arr, _ in times),
+        ts_dep=tuple(dep.isoformat() if dep else "Н/Д" for _, dep in times),
+        stop_min=tuple(_or_na(field(stop, "StopDuration")) for stop in stops_data),
+    )
 
-    stops, current_date, prev_time = [], datetime.today().date(), None
-    
+
+def _route_view(number: str, route: TrainRoute, c0: str, c1: str) -> Dict:
+    """Маршрут глазами пары A-B: is_target у остановок и отрезок [A, B] (индексы в stops)"""
     # Преобразуем коды в int для сравнения
     code_from = int(c0) if str(c0).isdigit() else None  # Станция A
     code_to = int(c1) if str(c1).isdigit() else None    # Станция B
 
-    for stop in stops_data:
-        t_arr_str, t_dep_str = stop.get("ArrivalTime"), stop.get("DepartureTime")
-        
-        # Обработка отсутствующих или пустых времен
-        if not t_arr_str or t_arr_str == '':
-            ts_arr = "Н/Д"
-            full_arr = None
-        else:
-            dt_arr_time = datetime.strptime(normalize_time(t_arr_str), "%H:%M:%S").time()
-            if prev_time and dt_arr_time < prev_time:
-                current_date += timedelta(days=1)
-            prev_time = dt_arr_time
-            full_arr = datetime.combine(current_date, dt_arr_time)
-            ts_arr = full_arr.isoformat()
-        
-        if not t_dep_str or t_dep_str == '':
-            ts_dep = "Н/Д"
-            full_dep = None
-        else:
-            dt_dep_time = datetime.strptime(normalize_time(t_dep_str), "%H:%M:%S").time()
-            full_dep = datetime.combine(current_date, dt_dep_time)
-            if full_arr and full_dep < full_arr:
-                full_dep += timedelta(days=1)
-            ts_dep = full_dep.isoformat()
-        
-        # Определяем is_target: 0 = станция A, 1 = станция B, null = промежуточная
-        station_code = int(stop.get("StationCode")) if stop.get("StationCode") else None
-        
-        if station_code == code_from:
-            is_target = 0  # Станция отправления (A)
-        elif station_code == code_to:
-            is_target = 1  # Станция назначения (B)
-        else:
-            is_target = None  # Промежуточная станция
-            
-        stops.append({
-            "name": stop.get("StationName", "Н/Д"),
-            "code": stop.get("StationCode", "Н/Д"),
-            "ts_arr": ts_arr,
-            "ts_dep": ts_dep,
-            "stop_min": stop.get("StopDuration", "Н/Д"),
-            "is_target": is_target,
-        })
+    # is_target: 0 = станция A, 1 = станция B, null = промежуточная
+    targets = [0 if code == code_from else 1 if code == code_to else None for code in route.code_ints]
+    segment = None
+    if 0 in targets and 1 in targets[(a := targets.index(0)):]:
+        segment = [a, targets.index(1, a)]
+
+    stops = [
+        {"name": name, "code": code, "ts_arr": ts_arr, "ts_dep": ts_dep, "stop_min": stop_min, "is_target": is_target}
+        for name, code, ts_arr, ts_dep, stop_min, is_target
+        in zip(route.names, route.codes, route.ts_arr, route.ts_dep, route.stop_min, targets)
+    ]
+    return {"train": number, "stops": stops, "segment": segment}
+
+
+async def _train_route(number: str, c0: str, c1: str, p: str, s: str) -> TrainRoute:
+    """Маршрут поезда на сегодня; не нашёлся - EMPTY_ROUTE (и ROUTE_RETRY секунд не спрашиваем снова)"""
+    day = date.today()
+    key = _route_key(number, c0, c1, p, s, day)
+    if _route_failures.get(key):
+        return EMPTY_ROUTE
+    try:
+        return await _fetch_train_route(number, c0, c1, p, s, day)
+    except RouteUnavailable:
+        _route_failures.set(key, True)
+        return EMPTY_ROUTE
 
-    return {"train": number, "stops": stops}
+
+async def _fetch_stops_data(number: str, c0: str, c1: str, p: str, s: str) -> Dict:
+    """Получаем остановки для конкретного поезда."""
+    route = await _train_route(number, c0, c1, p, s)
+    return _route_view(number, route, c0, c1)
 
 
 async def _get_real_route(train_num: str, c0: str, c1: str, fallback: str, provider: str, service: str) -> str:
     """Получает реальный маршрут поезда (первая → последняя станция)."""
     try:
-        stops_data = await _fetch_stops_data(train_num, c0, c1, provider, service)
-        stops = stops_data.get("stops", [])
-        if stops and len(stops) >= 2:
-            return f"{stops[0]['name']} - {stops[-1]['name']}"
-        elif stops:
-            return stops[0]['name']
+        names = (await _train_route(train_num, c0, c1, provider, service)).names
+        if len(names) >= 2:
+            return f"{names[0]} - {names[-1]}"
+        elif names:
+            return names[0]
     except Exception as e:
-        print(e)
-        pass
-    print(f"n: {train_num} > {fallback}")
+        log.warning("route_lookup_failed", train=train_num, error=repr(e))
+    log.info("fallback_route", train=train_num, route=fallback) # шумное - пишется выборочно (log_sample)
     return fallback
 
 
+@single_flight("trains")
 @cached(ttl=300, cache=Cache.MEMORY)
-async def _fetch_routes_data(c0: str, c1: str) -> Dict:
-    """Получаем поезда между двумя станциями."""
+async def _fetch_trains(c0: str, c1: str) -> Tuple[Dict, List[Dict]]:
+    """Поезда между двумя станциями (без настоящих маршрутов)."""
     today = datetime.now().strftime("%d.%m.%Y")
     tasks = [
-        client.get(URLS["PRICES"], params={
+        _upstream("PRICES", "GET", params={
             "service_provider": "B2B_RZD", 
             "origin": c0, 
             "destination": c1, 
             "departureDate": today
         }),
-        client.post(URLS["DEPARTED"], json={
+        _upstream("DEPARTED", "POST", json={
             "departureExpressCode": c0, 
             "arrivalExpressCode": c1
         })
     ]
     responses = await asyncio.gather(*tasks, return_exceptions=True)
 
-    actual_data = responses[0].json() if isinstance(responses[0], httpx.Response) and responses[0].status_code == 200 else {}
-    departed_data = responses[1].json() if isinstance(responses[1], httpx.Response) and responses[1].status_code == 200 else []
-
-    # Собираем базовую информацию о поездах
-    trains_base = []
-    t: dict[str, any]
-    for t in departed_data + actual_data.get("Trains", []):
-        try:
-            dep = datetime.fromisoformat(t.get("DepartureDateTime") or t.get("DepartureTime"))
-            arr = datetime.fromisoformat(t.get("ArrivalDateTime") or t.get("ArrivalTime"))
-            if (origin := t.get('OriginName', 'Н/Д')) is None: origin = t.get("TrainName", "Н/Д")
-            if (dest := t.get('DestinationName', 'Н/Д')) is None: dest = t.get("TrainName", "Н/Д")
-            if (description := t.get("TrainDescription")) == '' or description is None: 
-                if t.get("Provider", "P1") == "P1":
-                    description = "СК"
-                else:
-                    description = "пригородный"
-            trains_base.append({
-                "name": t.get("TrainName") or '',
-                "type": description,
-                "number": t.get("TrainNumber"),
-                "ts_dep": dep,
-                "ts_arr": arr,
-                "is_express": t.get("CategoryId") == 2,
-                "class": t.get("TrainClassNames"),
-                "fallback_route": f"{origin} - {dest}",
-                "provider": t.get("Provider") or "P1",
-                "service": t.get("ServiceProvider") or "B2B_RZD"
-            })
-        except (ValueError, TypeError):
-            continue
-    
-    # Параллельно получаем реальные маршруты для всех поездов
-    route_tasks = [
-        _get_real_route(t["number"], c0, c1, t["fallback_route"], t["provider"], t["service"]) 
+    ok = lambda r: r.content if isinstance(r, httpx.Response) and r.status_code == 200 else None
+    info, priced = decode_prices(ok(responses[0]))
+    departed = decode_departed(ok(responses[1]))
+
+    # ушедшие поезда - это ещё и фактическое время отправления от c0
+    for t in departed:
+        delay_recorder.observe(t, c0)
+
+    # Собираем базовую информацию о поездах (битые записи пропускаем)
+    trains_base = [base for t in (*departed, *priced) if (base := train_base(t)) is not None]
+    return info, trains_base
+
+
+async def _real_routes(trains_base: List[Dict], c0: str, c1: str, deadline: float) -> List[Optional[str]]:
+    """
+    ⏳ Настоящие маршруты поездов, сколько успеем до `deadline` (loop.time()) 
+
+    Не успевшие - None; их поиск продолжается в фоне и заполняет кэш остановок.
+    Клиент ушёл раньше - поиски отменяются (общие с другими запросами доживут, см. flight.py).
+    """
+    lookups = [
+        asyncio.create_task(_get_real_route(t["number"], c0, c1, t["fallback_route"], t["provider"], t["service"]))
         for t in trains_base
     ]
-    real_routes = await asyncio.gather(*route_tasks)
+    if not lookups:
+        return []
+    timeout = max(deadline - asyncio.get_running_loop().time(), ROUTES_MIN_WAIT)
+    try:
+        _, pending = await asyncio.wait(lookups, timeout=timeout)
+    except asyncio.CancelledError:
+        for task in lookups:
+            task.cancel()
+        raise
+
+    for task in pending:
+        _background.add(task) # держим ссылку, иначе задачу может собрать GC
+        task.add_done_callback(_background.discard)
+    _routes_stats["late_lookups"] += len(pending)
+    return [None if task in pending else task.result() for task in lookups]
+
+
+async def _fetch_routes_data(c0: str, c1: str, budget: float = ROUTES_BUDGET) -> Dict:
+    """
+    Поезда между двумя станциями с настоящими маршрутами. 
+
+    Ждём не дольше `budget` секунд: кому маршрут не успели найти - fallback_route
+    и "incomplete": true. В кэш попадает только полный ответ.
+    """
+    if (data := _routes_cache.get((c0, c1))) is not None:
+        _routes_stats["cached"] += 1
+        return data
+
+    deadline = asyncio.get_running_loop().time() + budget
+    info, trains_base = await _fetch_trains(c0, c1)
+    real_routes = await _real_routes(trains_base, c0, c1, deadline)
 
     # Формируем финальный список (ВКЛЮЧАЕМ provider и service!)
     processed_trains = [
@@ -248,24 +336,33 @@ async def _fetch_routes_data(c0: str, c1: str) -> Dict:
             "name": train["name"],
             "type": train["type"],
             "number": train["number"],
-            "route": route,
+            "route": route or train["fallback_route"],
             "ts_dep": train["ts_dep"].isoformat(),
             "ts_arr": train["ts_arr"].isoformat(),
             "is_express": train["is_express"],
             "class": train["class"],
             "provider": train["provider"],      # ← Добавлено
-            "service": train["service"]         # ← Добавлено
+            "service": train["service"],        # ← Добавлено
+            "incomplete": route is None,        # маршрут ещё ищется - пока fallback_route
         }
         for train, route in zip(trains_base, real_routes)
     ]
 
-    return {
+    incomplete = any(train["incomplete"] for train in processed_trains)
+    data = {
         "info": {
-            "origin": actual_data.get("OriginStationName", "Н/Д"),
-            "destination": actual_data.get("DestinationStationName", "Н/Д")
+            "origin": info.get("origin") or "Н/Д",
+            "destination": info.get("destination") or "Н/Д"
         },
-        "trains": sorted(processed_trains, key=lambda x: x["ts_dep"])
+        "trains": sorted(processed_trains, key=lambda x: x["ts_dep"]),
+        "incomplete": incomplete,
     }
+    if incomplete:
+        _routes_stats["partial"] += 1
+    else:
+        _routes_stats["complete"] += 1
+        _routes_cache.set((c0, c1), data)
+    return data
 
 
 async def _find_train_provider_service(
@@ -274,9 +371,9 @@ async def _find_train_provider_service(
     code_to: str
 ) -> Tuple[Optional[str], Optional[str]]:
     """Находит provider и service для указанного поезда."""
-    routes_data = await _fetch_routes_data(code_from, code_to)
+    _, trains = await _fetch_trains(code_from, code_to) # маршруты тут не нужны
     
-    for train in routes_data.get("trains", []):
+    for train in trains:
         if train.get("number") == train_num:
             return train.get("provider"), train.get("service")
     
@@ -285,21 +382,34 @@ async def _find_train_provider_service(
 
 
 @rzd_api.get("/stations")
-async def get_stations(part: str):
+async def get_stations(req: Request, part: str):
     """Поиск станции по названию"""
-    return {"stations": await _fetch_stations_data(part)}
+    try:
+        return {"stations": await until_disconnected(req, _fetch_stations_data(part))}
+    except ClientDisconnected: # набрали следующую букву - этот ответ уже не нужен
+        return Response(status_code=CLIENT_GONE)
 
 
 @rzd_api.get("/routes")
-async def get_routes(code_from: str, code_to: str):
+async def get_routes(req: Request, code_from: str, code_to: str):
     """Получение списка рейсов между станциями"""
-    data = await _fetch_routes_data(code_from, code_to)
+    try:
+        data = await until_disconnected(req, _fetch_routes_data(code_from, code_to))
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_GONE)
     return data if data.get("trains") else {"status": "Not Found", "trains": []}
 
 
 @rzd_api.get("/station_list")
-async def get_station_list(train_num: str, str_from: str, str_to: str):
+async def get_station_list(req: Request, train_num: str, str_from: str, str_to: str):
     """Маршрут конкретного поезда"""
+    try:
+        return await until_disconnected(req, _station_list(train_num, str_from, str_to))
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_GONE)
+
+
+async def _station_list(train_num: str, str_from: str, str_to: str) -> Dict:
     stations_from = await _fetch_stations_data(str_from)
     stations_to = await _fetch_stations_data(str_to)
     code_from = stations_from[0].get("code")
@@ -308,16 +418,11 @@ async def get_station_list(train_num: str, str_from: str, str_to: str):
         train_num, code_from, code_to
     )
 
-    print(provider, service)
+    log.debug("train_provider", train=train_num, provider=provider, service=service)
     # Если поезд не найден в маршрутах - используем дефолтные значения
     if provider is None:
         provider = "P1"
     if service is None:
         service = "B2B_RZD"
     
-    return await _fetch_stops_data(train_num, code_from, code_to, provider, service)
-
-
-@rzd_api.on_event("shutdown")
-async def shutdown_event():
-    await client.aclose()
\ No newline at end of file
+    return await _fetch_stops_data(train_num, code_from, code_to, provider, service)
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+<| rzd_decode.py |>
+Описание:
+разбор ответов RZD прямо из байтов.
+- если стоит msgspec: ответ декодируется сразу в типизированные структуры,
+  лишние поля даже не создаются как объекты Python; не сошлась схема -
+  разбираем тем же кодом, но через обычный json (как раньше)
+- лента DEPARTED короткая, а поля факта в ней настраиваются (tools/delays.py),
+  поэтому её записи остаются dict со всеми полями
+- время остановок ("7:05", "07:05:30") считается целыми секундами за один
+  проход по всему маршруту, с переходом через полночь, без strptime
+Made with ❤️ by @snowlover4ever
+"""
+
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import msgspec
+except ImportError: # pragma: no cover
+    msgspec = None
+
+decode_stats = {"typed": 0, "fallback": 0}
+
+if msgspec is not None:
+    class PricedTrain(msgspec.Struct):
+        TrainNumber: Optional[str] = None
+        TrainName: Optional[str] = None
+        TrainDescription: Optional[str] = None
+        DepartureDateTime: Optional[str] = None
+        DepartureTime: Optional[str] = None
+        ArrivalDateTime: Optional[str] = None
+        ArrivalTime: Optional[str] = None
+        OriginName: Optional[str] = None
+        DestinationName: Optional[str] = None
+        Provider: Optional[str] = None
+        ServiceProvider: Optional[str] = None
+        CategoryId: Optional[int] = None
+        TrainClassNames: Any = None
+
+    class PricesResponse(msgspec.Struct):
+        Trains: List[PricedTrain] = []
+        OriginStationName: Optional[str] = None
+        DestinationStationName: Optional[str] = None
+
+    class RouteStop(msgspec.Struct):
+        StationName: Optional[str] = None
+        StationCode: Any = None
+        ArrivalTime: Optional[str] = None
+        DepartureTime: Optional[str] = None
+        StopDuration: Any = None
+
+    class Route(msgspec.Struct):
+        RouteStops: List[RouteStop] = []
+
+    class RouteResponse(msgspec.Struct):
+        Routes: List[Route] = []
+
+    _prices = msgspec.json.Decoder(PricesResponse)
+    _departed = msgspec.json.Decoder(List[Dict[str, Any]]) # все поля: какие из них факт - решает env
+    _route = msgspec.json.Decoder(RouteResponse)
+else:
+    _prices = _departed = _route = None
+
+
+def field(item, key: str):
+    """Поле и у структуры, и у dict (запасной путь)"""
+    return item.get(key) if isinstance(item, dict) else getattr(item, key, None)
+
+
+def _decode(decoder, content: bytes, typed: Callable[[Any], Any], fallback: Callable[[Any], Any]):
+    """Типизированный разбор; схема не сошлась или нет msgspec - json.loads + fallback"""
+    if decoder is not None:
+        try:
+            result = typed(decoder.decode(content))
+            decode_stats["typed"] += 1
+            return result
+        except msgspec.DecodeError:
+            pass # схема поменялась - не падаем, разбираем как раньше
+    decode_stats["fallback"] += 1
+    return fallback(json.loads(content))
+
+
+# ---------- /routes ----------
+
+def decode_prices(content: Optional[bytes]) -> Tuple[dict, list]:
+    """PRICES -> (станции отправления/назначения, поезда)"""
+    if not content:
+        return {}, []
+    info = lambda data: {"origin": field(data, "OriginStationName"), "destination": field(data, "DestinationStationName")}
+    return _decode(
+        _prices, content,
+        lambda data: (info(data), data.Trains),
+        lambda raw: (info(raw), raw.get("Trains") or []) if isinstance(raw, dict) else ({}, []),
+    )
+
+
+def decode_departed(content: Optional[bytes]) -> list:
+    if not content:
+        return []
+    return _decode(_departed, content, lambda data: data, lambda raw: raw if isinstance(raw, list) else [])
+
+
+def train_base(t) -> Optional[dict]:
+    """Общий вид поезда из PRICES / DEPARTED; None - битая запись"""
+    try:
+        dep = datetime.fromisoformat(field(t, "DepartureDateTime") or field(t, "DepartureTime"))
+        arr = datetime.fromisoformat(field(t, "ArrivalDateTime") or field(t, "ArrivalTime"))
+    except (ValueError, TypeError):
+        return None
+    name = field(t, "TrainName")
+    origin = field(t, "OriginName") or name or "Н/Д"
+    dest = field(t, "DestinationName") or name or "Н/Д"
+    provider = field(t, "Provider") or "P1"
+    return {
+        "name": name or '',
+        "type": field(t, "TrainDescription") or ("СК" if provider == "P1" else "пригородный"),
+        "number": field(t, "TrainNumber"),
+        "ts_dep": dep,
+        "ts_arr": arr,
+        "is_express": field(t, "CategoryId") == 2,
+        "class": field(t, "TrainClassNames"),
+        "fallback_route": f"{origin} - {dest}",
+        "provider": provider,
+        "service": field(t, "ServiceProvider") or "B2B_RZD",
+    }
+
+
+# ---------- /station_list ----------
+
+def decode_route_stops(content: bytes) -> list:
+    """TrainRoute -> остановки первого маршрута"""
+    return _decode(
+        _route, content,
+        lambda data: data.Routes[0].RouteStops if data.Routes else [],
+        lambda raw: ((raw.get("Routes") or [{}])[0]).get("RouteStops", []),
+    )
+
+
+def clock_seconds(value: Optional[str]) -> Optional[int]:
+    """'7:05' / '07:05:30' -> секунды от полуночи; пусто -> None"""
+    if not value:
+        return None
+    hours, _, rest = value.partition(":")
+    minutes, _, seconds = rest.partition(":")
+    h, m, s = int(hours), int(minutes), int(seconds or 0)
+    if not (0 <= h < 24 and 0 <= m < 60 and 0 <= s < 60):
+        raise ValueError(f"bad time: {value!r}")
+    return h * 3600 + m * 60 + s
+
+
+def roll_stop_times(times: Iterable[Tuple[Optional[str], Optional[str]]], start: date) -> List[Tuple[Optional[datetime], Optional[datetime]]]:
+    """
+    ⏱️ Время прибытия/отправления всех остановок -> datetime с учётом перехода через полночь \n
+    Прибытие раньше предыдущего прибытия - наступили следующие сутки.
+    Отправление раньше прибытия на той же станции - стоянка через полночь.
+    """
+    offsets, day, prev = [], 0, None
+    for arr_str, dep_str in times:
+        arr, dep = clock_seconds(arr_str), clock_seconds(dep_str)
+        if arr is not None:
+            if prev is not None and arr < prev:
+                day += 86400
+            prev = arr
+            arr += day
+        if dep is not None:
+            dep += day
+            if arr is not None and dep < arr:
+                dep += 86400
+        offsets.append((arr, dep))
+
+    midnight = datetime.combine(start, time())
+    at = lambda offset: None if offset is None else midnight + timedelta(seconds=offset)
+    return [(at(arr), at(dep)) for arr, dep in offsets]
@@ -0,0 +1,196 @@
+"""
+<| api.py |>
+Описание:
+бенчмарк эндпоинтов профиля на базе из `backend.bench.seed`.
+Приложение крутится в этом же процессе (httpx.ASGITransport), без сети и uvicorn,
+поэтому меряется именно наш код + БД. Сценарии:
+    info_self / info_other / search / add_comment / reputation
+Для каждого: запросов в секунду, p50/p95/p99 и SQL-запросов на запрос
+(из заголовка Server-Timing, см. tools/metrics.py).
+База из --db не меняется: каждый прогон идёт на её временной копии.
+
+Запуск:
+    python -m backend.bench.api --db bench.db --save bench/baseline.json
+    python -m backend.bench.api --db bench.db --compare bench/baseline.json
+С --compare выходит с кодом 1, если p95 или queries/req выросли больше --tolerance.
+Made with ❤️ by @snowlover4ever
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+
+def _parse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк /info, /search, /profile/add_comment, /profile/reputation")
+    parser.add_argument("--db", required=True, help="база из backend.bench.seed")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", default="info_self,info_other,search,add_comment,reputation")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="записать результат в JSON")
+    parser.add_argument("--compare", help="сравнить с сохранённым JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимый рост, доля (0.2 = +20%%)")
+    return parser.parse_args()
+
+
+args = _parse() if __name__ == "__main__" else None
+if args is not None:
+    # бенчмарк пишет (комментарии, голоса) - каждый прогон идёт на свежей копии,
+    # иначе второй прогон упрётся в "уже голосовал" и цифры не сравнить
+    workdir = tempfile.mkdtemp(prefix="loltrains-bench-")
+    shutil.copyfile(args.db, os.path.join(workdir, "bench.db"))
+    os.environ["bench_db"] = os.path.join(workdir, "bench.db")
+os.environ.setdefault("token_live", "3600")
+
+import httpx
+from sqlalchemy import text
+
+from backend.bench.seed import (PASSWORD, USERNAME)
+from backend.models.database import (engine, init_db)
+from backend.tools.constant import COOKIE_NAME
+
+QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+class Scenario:
+    """Результаты одного сценария"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = []
+        self.queries = 0
+        self.statuses = {}
+        self.elapsed = 0.0
+
+    def record(self, ms: float, resp: httpx.Response):
+        self.latencies.append(ms)
+        self.statuses[resp.status_code] = self.statuses.get(resp.status_code, 0) + 1
+        if (found := QUERIES.search(resp.headers.get("server-timing", ""))):
+            self.queries += int(found.group(1))
+
+    def summary(self) -> dict:
+        lat, n = sorted(self.latencies), len(self.latencies) or 1
+        pick = lambda q: round(lat[min(len(lat) - 1, int(len(lat) * q))], 2) if lat else None
+        return {
+            "requests": len(lat),
+            "rps": round(len(lat) / self.elapsed, 1) if self.elapsed else None,
+            "p50_ms": pick(0.5),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "max_ms": round(lat[-1], 2) if lat else None,
+            "queries_per_req": round(self.queries / n, 2),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+        }
+
+
+async def _login(client: httpx.AsyncClient, username: str) -> str:
+    resp = await client.post("/login", data={"username": username, "password": PASSWORD})
+    if resp.status_code != 200:
+        sys.exit(f"не удалось войти как {username}: {resp.status_code} {resp.text}")
+    # Max-Age у нас дробный, httpx такую куку не сохраняет - берём из заголовка
+    return resp.headers["set-cookie"].split(";", 1)[0].split("=", 1)[1]
+
+
+async def _run(client: httpx.AsyncClient, scenario: Scenario, make_request, total: int, concurrency: int):
+    left = iter(range(total))
+
+    async def worker():
+        for i in left:
+            start = perf_counter()
+            resp = await make_request(i)
+            scenario.record((perf_counter() - start) * 1000, resp)
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    scenario.elapsed = perf_counter() - start
+
+
+async def bench(requests: int, concurrency: int, scenarios: list, seed_value: int) -> dict:
+    import main # после выставления bench_db; lifespan (фоновые задачи) не запускаем
+
+    rng = random.Random(seed_value)
+    await init_db()
+    async with engine.connect() as conn:
+        first, last = (await conn.execute(text(
+            "SELECT min(id), max(id) FROM users WHERE username LIKE 'bench\\_%' ESCAPE '\\'"
+        ))).one()
+    if first is None:
+        sys.exit("в базе нет пользователей bench_* - сначала python -m backend.bench.seed")
+    users = last - first + 1
+    user = lambda: USERNAME.format(rng.randint(first, last))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # каждый "клиент" бенчмарка - свой пользователь со своей сессией
+        viewers = [await _login(client, user()) for _ in range(concurrency)]
+        cookies = lambda i: {COOKIE_NAME: viewers[i % len(viewers)]}
+
+        requests_by_name = {
+            "info_self": lambda i: client.get("/info", cookies=cookies(i)),
+            "info_other": lambda i: client.get("/info", params={"who": user()}, cookies=cookies(i)),
+            "search": lambda i: client.get("/search", params={"who": f"bench_{rng.randint(first, last) // 10}"}),
+            "add_comment": lambda i: client.post(
+                "/profile/add_comment", data={"to": user(), "body": f"bench {i}"}, cookies=cookies(i)),
+            "reputation": lambda i: client.post(
+                "/profile/reputation", data={"to": user(), "action": rng.choice((1, -1))}, cookies=cookies(i)),
+        }
+
+        results = {}
+        for name in scenarios:
+            scenario = Scenario(name)
+            await _run(client, scenario, requests_by_name[name], requests, concurrency)
+            results[name] = scenario.summary()
+            print(f"{name:12} {json.dumps(results[name], ensure_ascii=False)}")
+
+    await engine.dispose()
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "users": users,
+        "requests": requests,
+        "concurrency": concurrency,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> bool:
+    """Печатает разницу с базовым прогоном. False - есть регрессия."""
+    ok = True
+    for name, now in current["results"].items():
+        if not (before := baseline["results"].get(name)):
+            continue
+        for metric in ("p95_ms", "queries_per_req", "rps"):
+            old, new = before.get(metric), now.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            # rps слишком шумный для автоматической проверки - только показываем
+            flag = "РЕГРЕССИЯ" if metric != "rps" and change > tolerance else ""
+            ok &= not flag
+            print(f"{name:12} {metric:16} {old:>10} -> {new:<10} {change:+.0%} {flag}")
+    return ok
+
+
+if __name__ == "__main__":
+    report = asyncio.run(bench(args.requests, args.concurrency, args.scenarios.split(","), args.seed))
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["users"] != report["users"]:
+            print(f"внимание: в базовом прогоне было {baseline['users']} пользователей, сейчас {report['users']}")
+        ok = compare(report, baseline, args.tolerance)
+    shutil.rmtree(workdir, ignore_errors=True)
+    if args.compare and not ok:
+        sys.exit(1)
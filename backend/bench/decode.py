@@ -0,0 +1,172 @@
+"""
+<| decode.py |>
+Описание:
+микробенчмарк разбора ответов RZD: как было (resp.json() + цепочки .get +
+strptime на каждую остановку) против rzd_decode (msgspec-структуры +
+пакетный разбор времени). Заодно проверяет, что результат совпадает.
+
+Данные - записанные ответы (--prices / --departed / --route, файлы JSON)
+или синтетические того же вида, если файлов нет.
+
+Запуск: python -m backend.bench.decode [--trains 400] [--stops 60] [--prices prices.json ...]
+Made with ❤️ by @snowlover4ever
+"""
+
+import argparse
+import json
+import os
+import random
+from datetime import date, datetime, timedelta
+from statistics import median
+from time import perf_counter
+
+os.environ.setdefault("token_live", "60")
+from backend.api.rzd_decode import (decode_prices, decode_departed, decode_route_stops, train_base, field,
+                                    roll_stop_times, msgspec)
+
+
+# ---------- синтетические ответы ----------
+
+def _train(rng: random.Random, i: int, start: datetime) -> dict:
+    dep = start + timedelta(minutes=rng.randrange(24 * 60))
+    return {
+        "TrainNumber": f"{i:03d}{rng.choice('АБВГЧ')}",
+        "TrainName": rng.choice(["Сапсан", "Ласточка", "", None]),
+        "TrainDescription": rng.choice(["СК ФИРМ", "", None]),
+        "DepartureDateTime": dep.isoformat(),
+        "ArrivalDateTime": (dep + timedelta(minutes=rng.randrange(60, 900))).isoformat(),
+        "OriginName": "МОСКВА", "DestinationName": "САНКТ-ПЕТЕРБУРГ",
+        "Provider": rng.choice(["P1", "P2"]), "ServiceProvider": "B2B_RZD",
+        "CategoryId": rng.choice([1, 2]),
+        "TrainClassNames": ["Плацкартный", "Купе"],
+        # в настоящем ответе ещё много полей, которые нам не нужны
+        "CarGroups": [{"CarType": "Compartment", "MinPrice": rng.randrange(1000, 9000),
+                       "Places": list(range(rng.randrange(10, 40)))} for _ in range(4)],
+    }
+
+
+def synthetic(trains: int, stops: int, seed: int = 7):
+    rng, start = random.Random(seed), datetime.combine(date.today(), datetime.min.time())
+    prices = {
+        "OriginStationName": "МОСКВА", "DestinationStationName": "САНКТ-ПЕТЕРБУРГ",
+        "Trains": [_train(rng, i, start) for i in range(trains)],
+    }
+    departed = [_train(rng, i, start - timedelta(hours=3)) for i in range(trains // 10)]
+    clock, route = rng.randrange(24 * 3600), []
+    for i in range(stops):
+        arr = clock % 86400
+        clock += rng.randrange(1, 15) * 60
+        fmt = "%H:%M" if i % 2 else "%H:%M:%S"
+        at = lambda s: (datetime.min + timedelta(seconds=s % 86400)).strftime(fmt)
+        route.append({
+            "StationName": f"СТАНЦИЯ {i}", "StationCode": str(2000000 + i),
+            "ArrivalTime": "" if i == 0 else at(arr), "DepartureTime": "" if i == stops - 1 else at(clock),
+            "StopDuration": (clock - arr) // 60, "Distance": i * 17,
+        })
+        clock += rng.randrange(10, 90) * 60
+    return (json.dumps(prices, ensure_ascii=False).encode(), json.dumps(departed, ensure_ascii=False).encode(),
+            json.dumps({"Routes": [{"RouteStops": route}]}, ensure_ascii=False).encode())
+
+
+# ---------- как было в rzd_api до rzd_decode ----------
+
+def _normalize_time(time_str: str) -> str:
+    return f"{time_str}:00" if len(time_str.split(':')) == 2 else time_str
+
+
+def legacy_routes(prices: bytes, departed: bytes) -> list:
+    actual_data, departed_data = json.loads(prices), json.loads(departed)
+    trains_base = []
+    for t in departed_data + actual_data.get("Trains", []):
+        try:
+            dep = datetime.fromisoformat(t.get("DepartureDateTime") or t.get("DepartureTime"))
+            arr = datetime.fromisoformat(t.get("ArrivalDateTime") or t.get("ArrivalTime"))
+            if (origin := t.get('OriginName', 'Н/Д')) is None: origin = t.get("TrainName", "Н/Д")
+            if (dest := t.get('DestinationName', 'Н/Д')) is None: dest = t.get("TrainName", "Н/Д")
+            if (description := t.get("TrainDescription")) == '' or description is None:
+                description = "СК" if t.get("Provider", "P1") == "P1" else "пригородный"
+            trains_base.append({
+                "name": t.get("TrainName") or '', "type": description, "number": t.get("TrainNumber"),
+                "ts_dep": dep, "ts_arr": arr, "is_express": t.get("CategoryId") == 2,
+                "class": t.get("TrainClassNames"), "fallback_route": f"{origin} - {dest}",
+                "provider": t.get("Provider") or "P1", "service": t.get("ServiceProvider") or "B2B_RZD",
+            })
+        except (ValueError, TypeError):
+            continue
+    return trains_base
+
+
+def legacy_stops(route: bytes) -> list:
+    stops_data = json.loads(route).get("Routes", [{}])[0].get("RouteStops", [])
+    out, current_date, prev_time = [], date.today(), None
+    for stop in stops_data:
+        t_arr_str, t_dep_str = stop.get("ArrivalTime"), stop.get("DepartureTime")
+        full_arr = full_dep = None
+        if t_arr_str:
+            dt_arr_time = datetime.strptime(_normalize_time(t_arr_str), "%H:%M:%S").time()
+            if prev_time and dt_arr_time < prev_time:
+                current_date += timedelta(days=1)
+            prev_time = dt_arr_time
+            full_arr = datetime.combine(current_date, dt_arr_time)
+        if t_dep_str:
+            full_dep = datetime.combine(current_date, datetime.strptime(_normalize_time(t_dep_str), "%H:%M:%S").time())
+            if full_arr and full_dep < full_arr:
+                full_dep += timedelta(days=1)
+        out.append((stop.get("StationCode"), full_arr, full_dep))
+    return out
+
+
+# ---------- новое ----------
+
+def new_routes(prices: bytes, departed: bytes) -> list:
+    _, priced = decode_prices(prices)
+    return [base for t in (*decode_departed(departed), *priced) if (base := train_base(t)) is not None]
+
+
+def new_stops(route: bytes) -> list:
+    stops = decode_route_stops(route)
+    times = roll_stop_times(((field(s, "ArrivalTime"), field(s, "DepartureTime")) for s in stops), date.today())
+    return [(field(s, "StationCode"), arr, dep) for s, (arr, dep) in zip(stops, times)]
+
+
+def _time(fn, *args, repeat: int) -> float:
+    runs = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn(*args)
+        runs.append(perf_counter() - start)
+    return median(runs) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Разбор ответов RZD: было / стало")
+    parser.add_argument("--trains", type=int, default=400)
+    parser.add_argument("--stops", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--prices")
+    parser.add_argument("--departed")
+    parser.add_argument("--route")
+    args = parser.parse_args()
+
+    prices, departed, route = synthetic(args.trains, args.stops)
+    read = lambda path, default: open(path, "rb").read() if path else default
+    prices, departed, route = read(args.prices, prices), read(args.departed, departed), read(args.route, route)
+
+    # результат должен совпадать (названия маршрутов сравниваем только по числу поездов:
+    # для записей с OriginName = null новая версия берёт TrainName, а не "None")
+    old_r, new_r = legacy_routes(prices, departed), new_routes(prices, departed)
+    assert [(t["number"], t["ts_dep"], t["ts_arr"]) for t in old_r] == [(t["number"], t["ts_dep"], t["ts_arr"]) for t in new_r]
+    assert legacy_stops(route) == new_stops(route)
+
+    print(f"msgspec: {'да ' + msgspec.__version__ if msgspec else 'нет (запасной путь json)'}")
+    print(f"payload: PRICES {len(prices) // 1024} KiB, DEPARTED {len(departed) // 1024} KiB, TrainRoute {len(route) // 1024} KiB")
+    for name, old, new, data in (
+        ("routes", legacy_routes, new_routes, (prices, departed)),
+        ("stops", legacy_stops, new_stops, (route,)),
+    ):
+        t_old, t_new = _time(old, *data, repeat=args.repeat), _time(new, *data, repeat=args.repeat)
+        print(f"{name:7} было {t_old:8.3f} мс   стало {t_new:8.3f} мс   x{t_old / t_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
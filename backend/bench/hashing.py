@@ -0,0 +1,66 @@
+"""
+<| hashing.py |>
+Описание:
+бенчмарк задержки event loop во время всплеска логинов.
+Сравнивает bcrypt прямо в event loop (как было) и через `hash_pool`.
+
+Запуск: python -m backend.bench.hashing [кол-во логинов]
+Made with ❤️ by @snowlover4ever
+"""
+
+import asyncio
+import os
+import sys
+from statistics import mean
+from time import perf_counter
+
+os.environ.setdefault("token_live", "60")
+from backend.tools.user.user import (crypt, verify_pw, hash_pool)
+
+TICK = 0.005 # как часто "запрос /routes" просыпается в event loop
+
+
+async def _probe(lags: list, stop: asyncio.Event):
+    """Имитирует лёгкие запросы: меряет, насколько позже срока нас разбудили."""
+    while not stop.is_set():
+        start = perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(perf_counter() - start - TICK)
+
+
+async def _burst(logins: int, hashed: str, pooled: bool) -> dict:
+    lags, stop = [], asyncio.Event()
+    probe = asyncio.create_task(_probe(lags, stop))
+    await asyncio.sleep(TICK * 2)
+
+    async def login_sync():
+        crypt.verify("password", hashed) # старое поведение: блокирует loop
+        await asyncio.sleep(0)
+
+    start = perf_counter()
+    await asyncio.gather(*(verify_pw("password", hashed) if pooled else login_sync() for _ in range(logins)))
+    elapsed = perf_counter() - start
+
+    stop.set()
+    await probe
+    lags.sort()
+    return {
+        "mode": "pool" if pooled else "inline",
+        "logins": logins,
+        "total_s": round(elapsed, 3),
+        "lag_avg_ms": round(mean(lags) * 1000, 2),
+        "lag_p99_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 2),
+        "lag_max_ms": round(lags[-1] * 1000, 2),
+    }
+
+
+async def main(logins: int):
+    hashed = crypt.hash("password")
+    hash_pool.queue_limit = max(hash_pool.queue_limit, logins) # в бенчмарке никого не отклоняем
+    for pooled in (False, True):
+        print(await _burst(logins, hashed, pooled))
+    hash_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -0,0 +1,150 @@
+"""
+<| seed.py |>
+Описание:
+генератор синтетических данных для бенчмарков БД: пользователи, репутация,
+комментарии и голоса в объёмах как в проде (миллионы строк).
+- детерминированный: один и тот же --seed даёт одну и ту же базу
+- вставка пачками (executemany по BATCH строк) в одной транзакции на таблицу
+- у всех пользователей пароль PASSWORD, хэш считается один раз
+- пишет только в базу из --db (env bench_db), рабочую database.db не трогает
+
+Запуск: python -m backend.bench.seed --db bench.db --users 1000000 --comments 3000000 --votes 5000000
+Made with ❤️ by @snowlover4ever
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+
+PASSWORD = "bench-password"
+USERNAME = "bench_{}" # bench_<id>
+BATCH = 10_000
+
+
+def _parse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Синтетические данные для бенчмарков")
+    parser.add_argument("--db", required=True, help="файл SQLite (будет создан)")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--comments", type=int, default=300_000)
+    parser.add_argument("--votes", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+args = _parse() if __name__ == "__main__" else None
+if args is not None:
+    if os.path.abspath(args.db) == os.path.abspath("database.db"):
+        sys.exit("рабочую базу заполнять нельзя - укажите другой файл в --db")
+    os.environ["bench_db"] = args.db # до импорта database.py
+os.environ.setdefault("token_live", "60")
+
+from sqlalchemy import (insert, text)
+
+from backend.models import (User, Comment, Favorites, Linked, Report, Reputation, Chat, Delay) # noqa: F401 - все таблицы
+from backend.models.database import (engine, init_db)
+from backend.tools.random.imgs import get_all_defaults
+from backend.tools.user.user import crypt
+
+
+async def _bulk(table, rows, total: int):
+    """Пишет строки из генератора пачками, печатает скорость."""
+    start, done, batch = perf_counter(), 0, []
+    async with engine.begin() as conn:
+        await conn.execute(text("PRAGMA synchronous=OFF")) # только на время генерации
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH:
+                await conn.execute(insert(table), batch)
+                done += len(batch)
+                batch = []
+                print(f"\r  {table.name}: {done}/{total}", end="", flush=True)
+        if batch:
+            await conn.execute(insert(table), batch)
+            done += len(batch)
+    elapsed = perf_counter() - start
+    print(f"\r  {table.name}: {done} строк за {elapsed:.1f} с ({done / max(elapsed, 1e-9):.0f} строк/с)")
+
+
+def _users(rng: random.Random, count: int, first_id: int, password: str):
+    photos, banners = get_all_defaults()
+    photos, banners = photos or ["/api/media/defaults/p1.png"], banners or ["/api/media/defaults/b1.png"]
+    now = datetime.now()
+    for i in range(count):
+        created = now - timedelta(seconds=rng.randrange(3 * 365 * 86400))
+        yield {
+            "id": first_id + i,
+            "username": USERNAME.format(first_id + i),
+            "nickname": f"Пассажир {first_id + i}",
+            "description": "синтетический пользователь" if rng.random() < 0.5 else "",
+            "password": password,
+            "photo": rng.choice(photos),
+            "banner": rng.choice(banners),
+            "role": "USER",
+            "achievements": {},
+            "ip_address": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            "last_login": created + timedelta(seconds=rng.randrange(86400 * 30)),
+            "date_created": created,
+        }
+
+
+def _comments(rng: random.Random, count: int, first_id: int, users: int):
+    now = datetime.now()
+    # у популярных профилей комментариев больше: квадрат равномерного смещает к началу
+    for i in range(count):
+        yield {
+            "sender_id": first_id + rng.randrange(users),
+            "target_id": first_id + int(rng.random() ** 2 * users),
+            "body": f"комментарий #{i}",
+            "date": now - timedelta(seconds=rng.randrange(365 * 86400)),
+        }
+
+
+def _votes(rng: random.Random, count: int, first_id: int, users: int, tally: list):
+    now, seen = datetime.now(), set()
+    while len(seen) < count:
+        voter, target = rng.randrange(users), int(rng.random() ** 2 * users)
+        if voter == target or (voter, target) in seen:
+            continue
+        seen.add((voter, target))
+        value = 1 if rng.random() < 0.8 else -1
+        tally[target][0 if value == 1 else 1] += 1
+        yield {
+            "voter_id": first_id + voter,
+            "target_id": first_id + target,
+            "value": value,
+            "date": now - timedelta(seconds=rng.randrange(365 * 86400)),
+        }
+
+
+async def seed(users: int, comments: int, votes: int, seed_value: int = 42):
+    """🌱 Заполняет текущую базу (env bench_db). Пользователи дописываются после уже существующих."""
+    rng = random.Random(seed_value)
+    votes = min(votes, users * (users - 1)) # больше пар голосующий-цель не бывает
+    await init_db()
+    async with engine.connect() as conn:
+        first_id = (await conn.execute(text("SELECT coalesce(max(id), 0) + 1 FROM users"))).scalar()
+        await conn.execute(text("PRAGMA journal_mode=WAL"))
+
+    print(f"seed={seed_value}: {users} пользователей, {comments} комментариев, {votes} голосов")
+    await _bulk(User.User.__table__, _users(rng, users, first_id, crypt.hash(PASSWORD)), users)
+    await _bulk(Comment.CommentModel.__table__, _comments(rng, comments, first_id, users), comments)
+
+    tally = [[0, 0] for _ in range(users)]
+    await _bulk(Reputation.Vote.__table__, _votes(rng, votes, first_id, users, tally), votes)
+    await _bulk(
+        Reputation.ReputationModel.__table__,
+        ({"user_id": first_id + i, "likes": likes, "dislikes": dislikes} for i, (likes, dislikes) in enumerate(tally)),
+        users,
+    )
+
+    async with engine.connect() as conn:
+        await conn.execute(text("ANALYZE")) # статистика для планировщика, как после optimize_db
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(seed(args.users, args.comments, args.votes, args.seed))
@@ -0,0 +1,27 @@
+from sqlalchemy import ForeignKey, String, DateTime, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from backend.models.database import Base
+from datetime import datetime, UTC
+
+class ChatRoomModel(Base):
+    __tablename__ = "chat_rooms"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(32), unique=True, index=True)
+    date_created: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(UTC))
+
+class ChatMessageModel(Base):
+    __tablename__ = "chat_messages"
+
+    # id выдаёт сервер (см. tools/chat/writer.py), он растёт со временем -> история по id
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    room_id: Mapped[int] = mapped_column(ForeignKey("chat_rooms.id"))
+    sender_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    body: Mapped[str] = mapped_column(String(1024))
+    attachment: Mapped[str | None] = mapped_column(default=None) # url из media/store
+    deleted: Mapped[bool] = mapped_column(default=False) # удалено модератором
+    date: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(UTC))
+
+    __table_args__ = (
+        Index("ix_chat_messages_room_id_id", "room_id", "id"), # история комнаты
+    )
@@ -0,0 +1,53 @@
+from sqlalchemy import String, DateTime, Date, Index, SmallInteger, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from backend.models.database import Base
+from datetime import datetime, date
+
+class DelayObservationModel(Base):
+    """Сырые наблюдения из ленты DEPARTED: только дописываются, старые чистит maintenance"""
+    __tablename__ = "delay_observations"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    train_number: Mapped[str] = mapped_column(String(16))
+    station_code: Mapped[int] = mapped_column()
+    scheduled: Mapped[datetime] = mapped_column(DateTime) # отправление по расписанию
+    delay_min: Mapped[int] = mapped_column(SmallInteger) # факт - план, минуты (< 0 - раньше)
+    observed_at: Mapped[datetime] = mapped_column(DateTime)
+
+    __table_args__ = (
+        Index("ix_delay_observations_scheduled", "scheduled"), # свёртка по часам + очистка
+    )
+
+class DelayHourlyModel(Base):
+    __tablename__ = "delay_hourly"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    train_number: Mapped[str] = mapped_column(String(16))
+    station_code: Mapped[int] = mapped_column()
+    hour: Mapped[datetime] = mapped_column(DateTime) # начало часа (по расписанию)
+    departures: Mapped[int] = mapped_column()
+    late: Mapped[int] = mapped_column() # опоздали больше чем на LATE_MIN
+    delay_sum: Mapped[int] = mapped_column() # сумма, чтобы среднее складывалось при свёртке
+    delay_max: Mapped[int] = mapped_column()
+
+    __table_args__ = (
+        UniqueConstraint("train_number", "station_code", "hour"),
+        Index("ix_delay_hourly_hour", "hour"),
+    )
+
+class DelayDailyModel(Base):
+    __tablename__ = "delay_daily"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    train_number: Mapped[str] = mapped_column(String(16))
+    station_code: Mapped[int] = mapped_column()
+    day: Mapped[date] = mapped_column(Date)
+    departures: Mapped[int] = mapped_column()
+    late: Mapped[int] = mapped_column()
+    delay_sum: Mapped[int] = mapped_column()
+    delay_max: Mapped[int] = mapped_column()
+
+    __table_args__ = (
+        UniqueConstraint("train_number", "station_code", "day"), # он же индекс для запросов по поезду
+        Index("ix_delay_daily_station_day", "station_code", "day"),
+    )
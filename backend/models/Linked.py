@@ -16,6 +16,6 @@ class LinkedTrainModel(Base):
     route0: Mapped[str] = mapped_column() # from
     route1: Mapped[str] = mapped_column() # to
 
-    arrival_time: Mapped[datetime] = mapped_column(DateTime) # time to delete link
+    arrival_time: Mapped[datetime] = mapped_column(DateTime, index=True) # time to delete link
 
     user: Mapped["User"] = relationship(back_populates="linked")
@@ -1,12 +1,15 @@
 from sqlalchemy.ext.asyncio import (AsyncSession, create_async_engine, async_sessionmaker)
 from sqlalchemy.orm import DeclarativeBase
+from backend.tools.metrics import track_queries
+from backend.tools.constant import BENCH_DB
 
 class Base(DeclarativeBase):
     pass
 
-DATABASE_URL = "sqlite+aiosqlite:///./database.db"
+DATABASE_URL = f"sqlite+aiosqlite:///{BENCH_DB or './database.db'}" # env bench_db - только для бенчмарков и тестов
 
 engine = create_async_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+track_queries(engine) # число и время SQL-запросов на каждый HTTP-запрос
 
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
@@ -14,7 +17,14 @@ async def get_db() -> AsyncSession: #type: ignore
     async with async_session_maker() as session:
         yield session
 
+def _create_indexes(conn):
+    # create_all не добавляет новые индексы в уже существующие таблицы
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_indexes)
 
@@ -5,7 +5,9 @@ from backend.models.database import (get_db, AsyncSession)
 from backend.models.User import User
 from backend.models.Reputation import ReputationModel
 from backend.tools.constant import COOKIE_NAME
-from backend.tools.user.user import (get_user, give_token, try_get_user, hash_pw, verify_pw)
+from backend.tools.user.user import (get_user, give_token, try_get_user, hash_pw, verify_pw,
+                                     invalidate_user, forget_token, token_needs_refresh)
+from backend.tools.pool import PoolBusy
 from backend.tools.random.imgs import (get_random_photos, get_random_banners)
 from datetime import datetime
 
@@ -33,12 +35,17 @@ async def registration(
     if ext_count.scalar() >= 3:
         return JSONResponse({"status": "TM"}, 403) # Too Much Accounts
     
+    try:
+        password = await hash_pw(password)
+    except PoolBusy:
+        return JSONResponse({"status": "BS"}, 503, {"Retry-After": "1"}) # BuSy
+
     # создание нового пользователя
     user = User(
         username = username,
         nickname = username,
         description = "",
-        password = hash_pw(password),
+        password = password,
 
         photo = get_random_photos(),
         banner = get_random_banners(),
@@ -66,20 +73,25 @@ async def authentication_user(
     db: AsyncSession = Depends(get_db)
 ):
     user = await get_user(username, db)
-    if not user or not verify_pw(password, user.password):
-        return JSONResponse({"status": "WR"}, 403) # Wrong Password Or Login
+    try:
+        if not user or not await verify_pw(password, user.password):
+            return JSONResponse({"status": "WR"}, 403) # Wrong Password Or Login
+    except PoolBusy:
+        return JSONResponse({"status": "BS"}, 503, {"Retry-After": "1"}) # BuSy
     
     user.last_login = datetime.now()
 
     give_token(resp, user) # выдаём новый токен
     await db.commit()
+    invalidate_user(user.username)
 
     return {"status": "OK"} # всё окей
 
 @app.post("/logout")
 async def logout_user(
-    resp: Response
+    req: Request, resp: Response
 ):
+    forget_token(req.cookies.get(COOKIE_NAME))
     resp.delete_cookie(COOKIE_NAME)
     return {"status": "OK"} # всё окей
 
@@ -87,7 +99,8 @@ async def logout_user(
 async def checking(req: Request, resp: Response, db: AsyncSession = Depends(get_db)) -> bool:
     user = await try_get_user(req, db)
     if user:
-        give_token(resp, user) # даём новый токен
+        if token_needs_refresh(req):
+            give_token(resp, user) # даём новый токен
         return True
     else:
         return False
\ No newline at end of file
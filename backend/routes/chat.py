@@ -0,0 +1,210 @@
+from backend.models.database import (get_db, AsyncSession, async_session_maker)
+from backend.models.Chat import (ChatRoomModel, ChatMessageModel)
+from backend.models.User import User
+from backend.tools.user.user import (try_get_user, check_role)
+from backend.tools.user.profile import (get_user_dict, get_short_dicts)
+from backend.tools.chat.broker import (broker, Connection)
+from backend.tools.chat.writer import (history_writer, next_message_id)
+from backend.tools.media.storage import (ingest_upload, is_stored, UploadRejected)
+from backend.tools.media.gc import register_references
+from backend.tools.pool import PoolBusy
+from backend.tools.cache import TTLCache
+from fastapi import (APIRouter, Request, Depends, Query, UploadFile, File, WebSocket, WebSocketDisconnect)
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from time import monotonic
+import json
+import re
+
+app = APIRouter()
+
+ROOM_PATTERN = re.compile(r"^[a-z0-9_-]{1,32}$")
+MAX_BODY = 1024
+MIN_INTERVAL = 0.3 # сек между сообщениями одного соединения
+HISTORY_LIMIT = 100
+
+_room_ids: dict[str, int] = {} # name -> id, комнаты не удаляются
+# user_id -> короткий dict отправителя для ещё не записанных сообщений (пишутся за доли секунды)
+_senders = TTLCache(10_000, 3600)
+
+
+async def _room_id(name: str, db: AsyncSession, create: bool = True) -> int | None:
+    if (room_id := _room_ids.get(name)) is not None:
+        return room_id
+
+    room = (await db.execute(select(ChatRoomModel).filter_by(name=name))).scalar_one_or_none()
+    if not room and create:
+        db.add(room := ChatRoomModel(name=name, date_created=datetime.now()))
+        try:
+            await db.commit()
+        except IntegrityError: # другой воркер успел создать
+            await db.rollback()
+            room = (await db.execute(select(ChatRoomModel).filter_by(name=name))).scalar_one()
+    if room:
+        _room_ids[name] = room.id
+        return room.id
+    return None
+
+
+def _message_dict(row: dict, sender: dict | None, room: str) -> dict:
+    return {
+        "type": "message",
+        "id": str(row["id"]), # больше 2^53, в JS только строкой
+        "room": room,
+        "body": row["body"],
+        "attachment": row["attachment"],
+        "timestamp": row["date"].isoformat(),
+        "sender": sender,
+    }
+
+
+@register_references
+async def _chat_attachments(db: AsyncSession):
+    async with history_writer.lock: # БД + буфер согласованно, как в истории
+        rows = await db.execute(
+            select(ChatMessageModel.attachment)
+            .filter(ChatMessageModel.attachment.is_not(None))
+            .filter(ChatMessageModel.deleted.is_(False))
+        )
+        pending = [row["attachment"] for row in history_writer.pending if row["attachment"]]
+    return [*rows.scalars().all(), *pending]
+
+
+@app.get("/chat/history")
+async def chat_history(
+    room: str = Query(...), before: str | None = Query(None), limit: int = Query(50, ge=1, le=HISTORY_LIMIT),
+    db: AsyncSession = Depends(get_db)
+):
+    if not ROOM_PATTERN.match(room): return JSONResponse({"status": "BR"}, 400) # Bad Room
+    if (room_id := await _room_id(room, db, create=False)) is None: return []
+    before = int(before) if before and before.isdigit() else None
+
+    query = (
+        select(ChatMessageModel, User)
+        .outerjoin(User, User.id == ChatMessageModel.sender_id)
+        .filter(ChatMessageModel.room_id == room_id) # идёт по индексу (room_id, id)
+        .filter(ChatMessageModel.deleted.is_(False))
+        .order_by(ChatMessageModel.id.desc())
+        .limit(limit)
+    )
+    if before:
+        query = query.filter(ChatMessageModel.id < before)
+    # под замком писателя: иначе строки, которые он как раз записывает,
+    # уже не в буфере, но ещё не в БД - и в историю не попадут
+    async with history_writer.lock:
+        rows = (await db.execute(query)).all()
+        pending = history_writer.pending_for(room_id)
+
+    # то, что ещё лежит в буфере записи, тоже история
+    messages = [
+        _message_dict(row, _senders.get(row["sender_id"]), room)
+        for row in reversed(pending)
+        if not row["deleted"] and (not before or row["id"] < before)
+    ]
+    senders = await get_short_dicts([sender for _, sender in rows]) # аватарки - одним заходом
+    messages += [
+        _message_dict({c.key: getattr(msg, c.key) for c in ChatMessageModel.__table__.columns}, sender, room)
+        for (msg, _), sender in zip(rows, senders)
+    ]
+    return messages[:limit]
+
+
+@app.post("/chat/attachment")
+async def upload_attachment(req: Request, file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    if not await try_get_user(req, db): return JSONResponse({"status": "NA"}, 401)
+    try:
+        url = await ingest_upload(file, "chat_attachments")
+    except UploadRejected as e:
+        return JSONResponse({"status": e.status}, e.http)
+    except PoolBusy:
+        return JSONResponse({"status": "BS"}, 503, {"Retry-After": "1"}) # BuSy
+    return {"status": "OK", "url": url}
+
+
+def _error(conn: Connection, status: str):
+    conn.offer(json.dumps({"type": "error", "status": status}))
+
+
+async def _message_room(message_id: int) -> int | None:
+    """Комната сообщения: из буфера писателя или из БД (под его замком - не потеряем записываемое)"""
+    async with history_writer.lock:
+        if (row := history_writer.pending_row(message_id)) is not None:
+            return row["room_id"]
+        async with async_session_maker() as db:
+            return (await db.execute(select(ChatMessageModel.room_id).filter_by(id=message_id))).scalar_one_or_none()
+
+
+async def _receive(conn: Connection, room_id: int, sender: dict | None):
+    """Читает команды клиента: message / delete"""
+    last_sent = 0.0
+    while True:
+        try:
+            data = json.loads(await conn.ws.receive_text())
+            kind = data.get("type")
+        except (ValueError, AttributeError, KeyError): # KeyError - бинарный кадр вместо текста
+            _error(conn, "ERR")
+            continue
+
+        if not conn.user:
+            _error(conn, "NA") # читать можно всем, писать - только после входа
+        elif kind == "message":
+            body = str(data.get("body") or "").strip()
+            attachment = data.get("attachment")
+            if not body and not attachment:
+                continue
+            if len(body) > MAX_BODY:
+                _error(conn, "LN") # Too Long
+            elif attachment and not is_stored(attachment):
+                _error(conn, "FT")
+            elif monotonic() - last_sent < MIN_INTERVAL:
+                _error(conn, "TF") # Too Fast
+            else:
+                last_sent = monotonic()
+                row = {
+                    "id": next_message_id(), "room_id": room_id, "sender_id": conn.user.id,
+                    "body": body, "attachment": attachment, "deleted": False, "date": datetime.now()
+                }
+                _senders.set(conn.user.id, sender) # для истории, пока строка в буфере
+                history_writer.add(row)
+                await broker.publish(conn.room, _message_dict(row, sender, conn.room))
+        elif kind == "delete":
+            if not check_role(conn.user.role, "SMODER"):
+                _error(conn, "NP")
+            elif str(data.get("id", "")).isdigit():
+                if await _message_room(int(data["id"])) != room_id:
+                    _error(conn, "NF") # нет такого сообщения в этой комнате
+                    continue
+                history_writer.delete(int(data["id"]))
+                await broker.publish(conn.room, {"type": "deleted", "id": str(data["id"])})
+        else:
+            _error(conn, "ERR")
+
+
+@app.websocket("/chat/ws")
+async def chat_socket(ws: WebSocket, room: str = Query(...)):
+    if not ROOM_PATTERN.match(room):
+        await ws.close(1008)
+        return
+
+    # сессия БД нужна только на вход - держать её всё время жизни сокета нельзя
+    async with async_session_maker() as db:
+        user = await try_get_user(ws, db)
+        room_id = await _room_id(room, db, create=user is not None) # комнаты создают только вошедшие
+    if room_id is None:
+        await ws.close(1008)
+        return
+    sender = await get_user_dict(user, False, full=False) if user else None
+
+    await ws.accept()
+    conn = Connection(ws, room, user)
+    broker.subscribe(conn)
+    send_task = conn.start() # отправка идёт в своей задаче через очередь
+    try:
+        await _receive(conn, room_id, sender)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(conn)
+        send_task.cancel()
@@ -0,0 +1,23 @@
+from backend.models.database import (get_db, AsyncSession)
+from backend.tools.delays import (train_delays, station_delays)
+from fastapi import (APIRouter, Depends, Query)
+
+app = APIRouter()
+
+@app.get("/delays/train")
+async def get_train_delays(
+    number: str = Query(..., min_length=1, max_length=16),
+    days: int = Query(30, ge=1, le=365),
+    db: AsyncSession = Depends(get_db)
+):
+    """Средняя задержка поезда за `days` дней (по станциям отправления и по дням)"""
+    return await train_delays(db, number, days)
+
+@app.get("/delays/station")
+async def get_station_delays(
+    code: int = Query(...),
+    days: int = Query(30, ge=1, le=365),
+    db: AsyncSession = Depends(get_db)
+):
+    """Поезда станции, самые опаздывающие сверху"""
+    return await station_delays(db, code, days)
@@ -1,36 +1,43 @@
 from backend.models.database import (get_db, AsyncSession)
-from backend.tools.user.user import (get_user, check_role, try_get_user, give_token)
-from backend.tools.user.profile import (get_user_dict, save_file)
+from backend.tools.user.user import (get_user, check_role, try_get_user, give_token,
+                                     invalidate_user, token_needs_refresh)
+from backend.tools.user.profile import (get_user_json, save_file, profile_changed,
+                                        profile_comment_added, profile_reputation_changed)
 from fastapi import (APIRouter, Request, Response, Form, Depends, Query, UploadFile, File)
 from fastapi.responses import JSONResponse
+from backend.tools.media.storage import UploadRejected
+from backend.tools.media.variants import (thumb_url, load_variants)
+from backend.tools.pool import PoolBusy
+from backend.tools.log import get_logger
 from datetime import datetime
 from backend.models import (User, Linked, Favorites, Reputation, Comment)
 from sqlalchemy import select
 
 app = APIRouter()
+log = get_logger("profile")
 
 @app.get("/info")
 async def get_info(
-    req: Request, resp: Response,
+    req: Request,
     who: str = Query(None),
     db: AsyncSession = Depends(get_db)
 ):
     viewer = await try_get_user(req, db)
-    if not (target := await get_user(who, db) or viewer): return JSONResponse({"status": "NF"}, 404)
+    if viewer and who in (None, viewer.username):
+        target = viewer # свой профиль - второй раз не ищем
+    elif not (target := await get_user(who, db) or viewer): return JSONResponse({"status": "NF"}, 404)
 
-    if viewer and viewer.username == target.username:
-        give_token(resp, target)
-    
     is_owner = getattr(viewer, 'username', None) == target.username
-    vote = await db.execute(select(Reputation.Vote)
-                            .filter(Reputation.Vote.voter_id == viewer.id)
-                            .filter(Reputation.Vote.target_id == target.id))
-    vote = vote.scalar_one_or_none()
-    return {
-        "target_user": await get_user_dict(target, is_owner, db),
-        "viewer_user": await get_user_dict(viewer, is_owner, db),
-        "is_owner": is_owner
-    }
+    # профили уже сериализованы, собираем ответ из готовых кусков
+    resp = Response(
+        b'{"target_user":' + await get_user_json(target, is_owner, db) +
+        b',"viewer_user":' + await get_user_json(viewer, is_owner, db) +
+        b',"is_owner":' + (b"true" if is_owner else b"false") + b'}',
+        media_type="application/json"
+    )
+    if is_owner and token_needs_refresh(req):
+        give_token(resp, target)
+    return resp
 
 @app.get("/search")
 async def search_users(
@@ -43,13 +50,15 @@ async def search_users(
         .limit(10)
     )
     users = result.scalars().all()
-    
+    await load_variants((u.photo, "photos") for u in users)
+
     return [
         {
             "id": u.id,
             "username": u.username,
             "nickname": u.nickname,
             "photo": u.photo,
+            "photo_thumb": thumb_url(u.photo),
         }
         for u in users
     ]
@@ -61,20 +70,28 @@ async def profile_edit(
 ):
     if not (sender := await try_get_user(req, db)): return JSONResponse({"status": "NA"}, 401)
     
-    user = sender if sender.username == target else get_user(target, db)
+    user = sender if sender.username == target else await get_user(target, db)
     if not user or (sender.username != target and not check_role(sender.role, "SMODER")):
         return {"status": "NP" if user else "NF"}
 
-    if (url := save_file(photo, "photos", user.photo, user.username)): user.photo = url
-    if (url := save_file(banner, "profileb", user.banner, user.username)): user.banner = url
-
-    user.description, user.nickname = description, (nickname or user.username)
     if len(nickname) > 64:
         return JSONResponse({"status": "LN"}, 400) # Too Long
     if len(description) > 256:
         return JSONResponse({"status": "LD"}, 400) # Too Long
+
+    try:
+        if (url := await save_file(photo, "photos", user.photo)): user.photo = url
+        if (url := await save_file(banner, "profileb", user.banner)): user.banner = url
+    except UploadRejected as e:
+        return JSONResponse({"status": e.status}, e.http)
+    except PoolBusy:
+        return JSONResponse({"status": "BS"}, 503, {"Retry-After": "1"}) # BuSy
+
+    user.description, user.nickname = description, (nickname or user.username)
     
     await db.commit()
+    invalidate_user(user.username)
+    profile_changed(user.id)
     return {"status": "OK"}
 
 @app.post("/profile/add_comment")
@@ -90,6 +107,8 @@ async def add_comment(req: Request, to: str = Form(...), body: str = Form(...),
     )
     db.add(comment)
     await db.commit()
+    await load_variants([(sender.photo, "photos")])
+    profile_comment_added(target.id, comment, sender)
     return {"status": "OK"}
 
 @app.post("/profile/reputation")
@@ -102,7 +121,7 @@ async def change_reputation_user(
     if not (target := await get_user(to, db)):
         return JSONResponse({"status": "NF"}, 404)
 
-    print(f"Sender: {sender.username} | Target: {target.username} | self vote? -> {sender.username == target.username}")
+    log.debug("reputation_vote", sender=sender.username, target=target.username, action=action)
     if sender.username == target.username: return {"status": "ERR", "detail": "Self-vote"}
 
     vote = await db.execute(select(Reputation.Vote)
@@ -128,6 +147,7 @@ async def change_reputation_user(
     ))
 
     await db.commit()
+    profile_reputation_changed(target.id, rep)
 
     return {"status": "OK"}
     
@@ -0,0 +1,43 @@
+from backend.models.database import (get_db, AsyncSession)
+from backend.tools.user.user import (try_get_user, check_role, user_cache, hash_pool)
+from backend.tools.user.profile import profile_cache
+from backend.tools.scheduler import scheduler
+from backend.tools.media.storage import (upload_pool, upload_stats)
+from backend.tools.media.variants import (variant_pool, variant_stats)
+from backend.tools.media.serving import media_stats
+from backend.tools.chat.broker import broker
+from backend.tools.chat.writer import history_writer
+from backend.tools.metrics import route_stats
+from backend.tools.delays import delay_recorder
+from backend.tools.profiler import profiler_stats
+from backend.tools.log import log_stats
+from backend.api.rzd_decode import decode_stats
+from backend.tools.flight import flight_stats
+from backend.api.rzd_api import routes_stats
+from fastapi import (APIRouter, Request, Depends)
+from fastapi.responses import JSONResponse
+
+app = APIRouter()
+
+@app.get("/stats")
+async def get_stats(req: Request, db: AsyncSession = Depends(get_db)):
+    if not (user := await try_get_user(req, db)): return JSONResponse({"status": "NA"}, 401)
+    if not check_role(user.role, "ADMIN"): return JSONResponse({"status": "NP"}, 403)
+
+    return {
+        "user_cache": user_cache.stats(),
+        "hash_pool": hash_pool.stats(),
+        "profile_cache": profile_cache.stats(),
+        "scheduler": scheduler.stats(),
+        "uploads": {**upload_stats, "pool": upload_pool.stats()},
+        "variants": {**variant_stats, "pool": variant_pool.stats()},
+        "media": media_stats,
+        "chat": {**broker.stats(), "writer": history_writer.stats()},
+        "delays": delay_recorder.stats(),
+        "routes": route_stats(),
+        "profiler": profiler_stats,
+        "log": log_stats,
+        "rzd_decode": decode_stats,
+        "rzd_cancel": flight_stats(),
+        "rzd_routes": routes_stats(),
+    }
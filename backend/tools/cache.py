@@ -0,0 +1,83 @@
+"""
+<| cache.py |>
+Описание:
+небольшой in-memory кэш с TTL и ограничением по размеру (LRU).
+Используется для горячих данных, которые живут в одном воркере.
+Made with ❤️ by @snowlover4ever
+"""
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Hashable, Iterator, Optional, Tuple
+
+
+class TTLCache:
+    """
+    🗃️ Ограниченный LRU-кэш с временем жизни записей \n
+    Считает попадания / промахи, чтобы можно было понять, работает ли он.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+
+        expires, value = item
+        if expires <= monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Кладёт значение. `ttl` можно сократить для конкретной записи."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def drop_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Удаляет все записи, для которых `predicate(key, value)` истинно."""
+        stale = [k for k, (_, v) in self._data.items() if predicate(k, v)]
+        for k in stale:
+            del self._data[k]
+        return len(stale)
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        now = monotonic()
+        return ((k, v) for k, (exp, v) in list(self._data.items()) if exp > now)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
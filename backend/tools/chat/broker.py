@@ -0,0 +1,195 @@
+"""
+<| broker.py |>
+Описание:
+in-process pub/sub для чата.
+- сообщение сериализуется один раз и кладётся в очереди всех подписчиков комнаты
+- у каждого соединения своя ограниченная очередь и своя задача отправки,
+  поэтому медленный клиент не тормозит остальных: переполнил очередь - отключаем
+- опционально общая шина между воркерами (redis pub/sub, env `chat_bus_url`)
+Made with ❤️ by @snowlover4ever
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import uuid
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+from fastapi import WebSocket
+
+from backend.tools.log import get_logger
+
+SEND_QUEUE = 256 # сообщений на соединение
+SLOW_CLOSE_CODE = 1013 # "Try Again Later" - клиент переподключится и дочитает историю
+BUS_CHANNEL = "loltrains:chat"
+
+log = get_logger("chat")
+
+
+class Connection:
+    """Одно WebSocket-соединение: очередь на отправку + задача, которая её разгребает."""
+
+    def __init__(self, ws: WebSocket, room: str, user=None):
+        self.ws = ws
+        self.room = room
+        self.user = user
+        self.queue: asyncio.Queue = asyncio.Queue(SEND_QUEUE)
+        self.slow = False
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, payload: str) -> bool:
+        """Положить сообщение без ожидания. False - клиент не успевает."""
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def kick(self):
+        """Клиент не успевает читать: бросаем очередь и закрываем сокет."""
+        self.slow = True
+        if self.task is not None:
+            self.task.cancel()
+
+    def start(self) -> asyncio.Task:
+        self.task = asyncio.create_task(self._sender())
+        return self.task
+
+    async def _sender(self):
+        try:
+            while True:
+                await self.ws.send_text(await self.queue.get())
+        except asyncio.CancelledError:
+            if self.slow:
+                with contextlib.suppress(Exception):
+                    await self.ws.close(SLOW_CLOSE_CODE) # receive в обработчике получит disconnect
+            raise
+
+
+class Broker:
+    """
+    📣 Комнаты -> соединения \n
+    `publish` не ждёт ни одного клиента: только put_nowait в их очереди.
+    """
+
+    def __init__(self):
+        self.rooms: Dict[str, Set[Connection]] = defaultdict(set)
+        self.published = 0
+        self.delivered = 0
+        self.dropped_slow = 0
+        self.bus: Optional["RedisBus"] = None
+
+    def subscribe(self, conn: Connection):
+        self.rooms[conn.room].add(conn)
+
+    def unsubscribe(self, conn: Connection):
+        if (members := self.rooms.get(conn.room)) is not None:
+            members.discard(conn)
+            if not members:
+                del self.rooms[conn.room]
+
+    def deliver(self, room: str, payload: str):
+        """Разослать локальным подписчикам комнаты."""
+        for conn in tuple(self.rooms.get(room, ())):
+            if conn.offer(payload):
+                self.delivered += 1
+            else:
+                self.dropped_slow += 1
+                self.unsubscribe(conn)
+                conn.kick()
+
+    async def publish(self, room: str, message: dict):
+        payload = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+        self.published += 1
+        self.deliver(room, payload)
+        if self.bus is not None:
+            await self.bus.publish(room, payload)
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self.rooms),
+            "connections": sum(len(members) for members in self.rooms.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_slow": self.dropped_slow,
+            "bus": self.bus.stats() if self.bus else None,
+        }
+
+
+class RedisBus:
+    """
+    🚌 Общая шина между воркерами через redis pub/sub \n
+    Свои же сообщения отбрасываем по `origin`.
+    """
+
+    def __init__(self, url: str, broker: Broker):
+        import redis.asyncio as redis # необязательная зависимость
+        self.redis = redis.from_url(url)
+        self.broker = broker
+        self.origin = uuid.uuid4().hex[:12]
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, room: str, payload: str):
+        try:
+            await self.redis.publish(BUS_CHANNEL, json.dumps({"o": self.origin, "r": room, "p": payload}))
+            self.sent += 1
+        except Exception as e:
+            self.errors += 1 # локальные подписчики сообщение уже получили
+            log.warning("bus_publish_failed", error=repr(e))
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(BUS_CHANNEL)
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    data = json.loads(item["data"])
+                    if data["o"] != self.origin:
+                        self.received += 1
+                        self.broker.deliver(data["r"], data["p"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                log.warning("bus_listener_failed", error=repr(e)) # переподключаемся
+                await asyncio.sleep(1)
+
+    def start(self):
+        self._task = asyncio.create_task(self._listen(), name="chat:bus")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.redis.aclose()
+
+    def stats(self) -> dict:
+        return {"origin": self.origin, "sent": self.sent, "received": self.received, "errors": self.errors}
+
+
+broker = Broker()
+
+
+async def start_bus():
+    """Подключает шину между воркерами, если задан `chat_bus_url`."""
+    if not (url := os.environ.get("chat_bus_url")):
+        return
+    try:
+        broker.bus = RedisBus(url, broker)
+    except ImportError:
+        log.error("bus_unavailable", reason="chat_bus_url задан, но пакет redis не установлен - чат только внутри воркера")
+        return
+    broker.bus.start()
+
+
+async def stop_bus():
+    if broker.bus is not None:
+        await broker.bus.stop()
+        broker.bus = None
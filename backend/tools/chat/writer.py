@@ -0,0 +1,229 @@
+"""
+<| writer.py |>
+Описание:
+пакетная запись истории чата. Сообщение сначала рассылается,
+а в БД попадает пачкой раз в FLUSH_EVERY секунд (или по FLUSH_SIZE штук),
+поэтому запись в SQLite не тормозит рассылку.
+- пачка не записалась MAX_ATTEMPTS раз подряд - пишем по одной строке:
+  строки, которые БД не принимает (IntegrityError и т.п.), выбрасываем в лог,
+  остальные ждут дальше; буфер не растёт больше MAX_PENDING
+- id сообщений выдаём сами - так их можно отдать клиентам до записи;
+  номер воркера в id - свободный слот, занятый flock'ом при старте
+Made with ❤️ by @snowlover4ever
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError: # Windows - там и воркер один (режим разработки)
+    fcntl = None
+
+from sqlalchemy import (insert, update)
+from sqlalchemy.exc import (DataError, IntegrityError)
+
+from backend.models.Chat import ChatMessageModel
+from backend.models.database import async_session_maker
+from backend.tools.constant import WORKER_ID_DIR
+from backend.tools.log import get_logger
+
+FLUSH_EVERY = 0.25 # сек
+FLUSH_SIZE = 500
+MAX_ATTEMPTS = 3 # неудачных записей пачки подряд, потом - по одной строке
+MAX_PENDING = 50_000 # сверху выбрасываем самые старые (БД лежит слишком долго)
+ROW_ERRORS = (IntegrityError, DataError) # БД не примет эту строку никогда - повторять бессмысленно
+
+log = get_logger("chat.writer")
+
+_EPOCH_MS = 1_700_000_000_000
+WORKER_SLOTS = 1024 # 10 бит на воркер
+_WORKER: Optional[int] = None
+_worker_lock = None # файл слота держим открытым, пока жив процесс
+_last_ms, _seq = 0, 0
+
+
+def claim_worker_id() -> int:
+    """
+    🔒 Занимает свободный номер воркера (flock на WORKER_ID_DIR/<n>.lock) \n
+    Блокировка живёт, пока жив процесс, - два живых воркера не получат один номер.
+    """
+    global _WORKER, _worker_lock
+    if _WORKER is not None:
+        return _WORKER
+    if fcntl is None:
+        _WORKER = os.getpid() % WORKER_SLOTS
+        return _WORKER
+
+    WORKER_ID_DIR.mkdir(parents=True, exist_ok=True)
+    for slot in range(WORKER_SLOTS):
+        lock = open(WORKER_ID_DIR / f"{slot}.lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            continue
+        _WORKER, _worker_lock = slot, lock
+        log.info("worker_id_claimed", worker=slot)
+        return slot
+    raise RuntimeError(f"all {WORKER_SLOTS} worker ids are taken")
+
+
+def next_message_id() -> int:
+    """
+    🆔 Растущий id: [время мс | воркер | счётчик] \n
+    Уникален между воркерами, упорядочен по времени. Больше 2^53 - клиентам отдаём строкой.
+    """
+    global _last_ms, _seq
+    worker = claim_worker_id() # обычно уже занят при старте (HistoryWriter.start)
+    now = max(int(time.time() * 1000) - _EPOCH_MS, _last_ms)
+    if now == _last_ms:
+        _seq = (_seq + 1) & 0xFFF
+        if _seq == 0: # 4096 сообщений за мс - берём следующую
+            now += 1
+    else:
+        _seq = 0
+    _last_ms = now
+    return (now << 22) | (worker << 12) | _seq
+
+
+class HistoryWriter:
+    """Буфер новых сообщений / удалений + фоновая задача, которая пишет их пачками."""
+
+    def __init__(self):
+        self.pending: List[dict] = []
+        self.pending_deletes: List[int] = []
+        self.flushes = 0
+        self.written = 0
+        self.last_batch = 0
+        self.failures = 0 # неудачных записей пачки подряд
+        self.dropped = 0
+        # flush держит его, пока строки уже не в pending, но ещё не в БД:
+        # история читает БД + pending под ним же, чтобы не пропустить такие строки
+        self.lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, row: dict):
+        self.pending.append(row)
+        if len(self.pending) > MAX_PENDING:
+            dropped, self.pending = self.pending[:-MAX_PENDING], self.pending[-MAX_PENDING:]
+            self._drop(dropped, "overflow")
+        if len(self.pending) >= FLUSH_SIZE:
+            self._wake.set()
+
+    def _drop(self, rows: List[dict], reason: str, error: Optional[Exception] = None):
+        self.dropped += len(rows)
+        log.error("history_rows_dropped", reason=reason, count=len(rows),
+                  ids=[row["id"] for row in rows[:50]], error=repr(error) if error else None)
+
+    def delete(self, message_id: int):
+        for row in self.pending:
+            if row["id"] == message_id:
+                row["deleted"] = True
+                return
+        self.pending_deletes.append(message_id)
+        self._wake.set()
+
+    def pending_for(self, room_id: int) -> List[dict]:
+        """Ещё не записанные сообщения комнаты (для истории; вызывать под self.lock)"""
+        return [row for row in self.pending if row["room_id"] == room_id]
+
+    def pending_row(self, message_id: int) -> Optional[dict]:
+        return next((row for row in self.pending if row["id"] == message_id), None)
+
+    async def _write(self, rows: List[dict], deletes: List[int]):
+        async with async_session_maker() as db:
+            if rows:
+                await db.execute(insert(ChatMessageModel), rows) # executemany
+            if deletes:
+                await db.execute(update(ChatMessageModel).where(ChatMessageModel.id.in_(deletes)).values(deleted=True))
+            await db.commit()
+
+    async def _write_one_by_one(self, rows: List[dict], deletes: List[int]) -> tuple:
+        """Ищет строки, которые БД не принимает; возвращает (записано, что осталось в очереди)"""
+        written, retry_rows, retry_deletes = 0, [], []
+        for row in rows:
+            try:
+                await self._write([row], [])
+                written += 1
+            except ROW_ERRORS as e:
+                self._drop([row], "rejected", e)
+            except Exception:
+                retry_rows.append(row) # БД недоступна - строка тут ни при чём
+        if deletes:
+            try:
+                await self._write([], deletes) # update идемпотентен - строкам отказывать не в чем
+            except Exception:
+                retry_deletes = deletes
+        return written, retry_rows, retry_deletes
+
+    async def flush(self):
+        async with self.lock:
+            rows, self.pending = self.pending, []
+            deletes, self.pending_deletes = self.pending_deletes, []
+            if not rows and not deletes:
+                return
+            try:
+                if self.failures >= MAX_ATTEMPTS:
+                    written, retry_rows, retry_deletes = await self._write_one_by_one(rows, deletes)
+                else:
+                    await self._write(rows, deletes)
+                    written, retry_rows, retry_deletes = len(rows), [], []
+            except Exception as e:
+                written, retry_rows, retry_deletes = 0, rows, deletes
+                log.error("history_flush_failed", rows=len(rows), attempt=self.failures + 1, exc_info=e)
+
+            if retry_rows or retry_deletes:
+                # вернём обратно, попробуем в следующий раз
+                self.failures += 1
+                self.pending[:0], self.pending_deletes[:0] = retry_rows, retry_deletes
+                if len(self.pending) > MAX_PENDING:
+                    overflow = len(self.pending) - MAX_PENDING
+                    self._drop(self.pending[:overflow], "overflow")
+                    del self.pending[:overflow]
+            else:
+                self.failures = 0
+            if written:
+                self.flushes += 1
+                self.written += written
+                self.last_batch = written
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), FLUSH_EVERY)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        claim_worker_id()
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._loop(), name="chat:writer")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush() # дописываем хвост
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self.pending),
+            "pending_deletes": len(self.pending_deletes),
+            "flushes": self.flushes,
+            "written": self.written,
+            "last_batch": self.last_batch,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "worker_id": _WORKER,
+        }
+
+
+history_writer = HistoryWriter()
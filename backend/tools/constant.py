@@ -1,9 +1,59 @@
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv()
 
 SECRET_KEY = os.environ.get("key")
 DATABASE_PATH = os.environ.get("db_path")
+BENCH_DB = os.environ.get("bench_db") # только бенчмарки и тесты: база вместо ./database.db
 TOKEN_LIFE = float(os.environ.get("token_live"))
-COOKIE_NAME = os.environ.get("cookie_name")
\ No newline at end of file
+COOKIE_NAME = os.environ.get("cookie_name")
+
+# Фоновые задачи (секунды, 0 = не запускать по расписанию)
+LINKED_PURGE_EVERY = float(os.environ.get("linked_purge_every", 300))
+DB_OPTIMIZE_EVERY = float(os.environ.get("db_optimize_every", 6 * 3600))
+DB_VACUUM_EVERY = float(os.environ.get("db_vacuum_every", 7 * 24 * 3600))
+PROFILE_WARMUP_EVERY = float(os.environ.get("profile_warmup_every", 30 * 60))
+VARIANTS_EVERY = float(os.environ.get("variants_every", 3600))
+PRECOMPRESS_EVERY = float(os.environ.get("precompress_every", 24 * 3600))
+MEDIA_GC_EVERY = float(os.environ.get("media_gc_every", 24 * 3600))
+
+# Профилирование по заголовку X-Profile (только если profiling=1)
+PROFILING = os.environ.get("profiling", "0") == "1"
+PROFILE_DIR = Path(os.environ.get("profile_dir", "profiles"))
+PROFILE_INTERVAL = float(os.environ.get("profile_interval_ms", 2))
+
+# Запуск: mode=prod - несколько воркеров без reload (python main.py)
+PRODUCTION = os.environ.get("mode", "dev") == "prod"
+HOST = os.environ.get("host", "0.0.0.0")
+PORT = int(os.environ.get("port", 8000))
+WORKERS = int(os.environ.get("workers", 0)) or os.cpu_count() or 1
+KEEP_ALIVE = int(os.environ.get("keep_alive", 75)) # больше, чем keepalive_timeout у прокси перед нами
+BACKLOG = int(os.environ.get("backlog", 4096))
+GRACEFUL_TIMEOUT = int(os.environ.get("graceful_timeout", 30)) # сек на дообслуживание запросов при остановке
+LIMIT_CONCURRENCY = int(os.environ.get("limit_concurrency", 0)) or None # сверх лимита - сразу 503
+SCHEDULER_LOCK = Path(os.environ.get("scheduler_lock", ".scheduler.lock"))
+WORKER_ID_DIR = Path(os.environ.get("worker_id_dir", ".worker_ids")) # flock-слоты: номер воркера в id сообщений чата
+DB_READY = os.environ.get("db_ready") == "1" # выставляет главный процесс после init_db
+
+# Пунктуальность (лента DEPARTED)
+DELAY_FLUSH_EVERY = float(os.environ.get("delay_flush_every", 30))
+DELAY_ROLLUP_EVERY = float(os.environ.get("delay_rollup_every", 3600))
+DELAY_RAW_DAYS = int(os.environ.get("delay_raw_days", 14)) # сырые наблюдения
+DELAY_HOURLY_DAYS = int(os.environ.get("delay_hourly_days", 90)) # почасовые свёртки; дневные храним всегда
+# Поля факта отправления в ленте DEPARTED (через запятую, берётся первое найденное).
+# Схема ленты не документирована: если в /stats растёт delays.no_actual, настоящие
+# поля пришедших записей видны там же, в delays.unknown_schema
+DEPARTED_ACTUAL_KEYS = os.environ.get("departed_actual_keys",
+                                      "ActualDepartureDateTime,FactDepartureDateTime,DepartureDateTimeFact,RealDepartureDateTime")
+DEPARTED_DELAY_KEYS = os.environ.get("departed_delay_keys", "DepartureDelay,DelayMinutes,Delay") # в минутах
+
+# Логи (JSON в stdout или в log_file)
+LOG_LEVEL = os.environ.get("log_level", "INFO").upper()
+LOG_FILE = os.environ.get("log_file")
+LOG_QUEUE = int(os.environ.get("log_queue", 10_000)) # записей; сверху - выбрасываем
+LOG_SAMPLE = os.environ.get("log_sample", "fallback_route=0.1") # событие=доля, через запятую
+
+# /routes: сколько секунд ждём настоящие маршруты поездов; кто не успел - fallback_route
+ROUTES_BUDGET = float(os.environ.get("routes_budget", 3))
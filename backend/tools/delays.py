@@ -0,0 +1,230 @@
+"""
+<| delays.py |>
+Описание:
+пунктуальность поездов по ленте DEPARTED.
+- каждый вызов /routes отдаёт сюда ушедшие поезда: план vs факт отправления
+- наблюдения копятся в буфере и пачкой дописываются в delay_observations
+- `rollup_delays` сворачивает их в delay_hourly, а часы - в delay_daily
+- эндпоинты читают только свёртки, поэтому отвечают одинаково быстро
+  и за неделю, и за год истории; сырые наблюдения живут RAW_DAYS
+Made with ❤️ by @snowlover4ever
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import (and_, case, delete, func, insert, select)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.database import (async_session_maker, engine)
+from backend.models.Delay import (DelayObservationModel as Obs, DelayHourlyModel as Hourly, DelayDailyModel as Daily)
+from backend.tools.cache import TTLCache
+from backend.tools.constant import (DELAY_RAW_DAYS, DELAY_HOURLY_DAYS, DEPARTED_ACTUAL_KEYS, DEPARTED_DELAY_KEYS)
+from backend.tools.log import get_logger
+
+log = get_logger("delays")
+
+
+def _keys(spec: str) -> tuple:
+    return tuple(key.strip() for key in spec.split(",") if key.strip())
+
+
+# Поля ленты DEPARTED: плановое время - как в PRICES, поля факта - из env (первое найденное)
+SCHEDULED_KEYS = ("DepartureDateTime", "DepartureTime")
+ACTUAL_KEYS = _keys(DEPARTED_ACTUAL_KEYS)
+DELAY_KEYS = _keys(DEPARTED_DELAY_KEYS) # уже в минутах
+UNKNOWN_SCHEMAS = 5 # сколько разных наборов полей без факта запоминаем для /stats
+
+LATE_MIN = 5 # опозданием считаем больше 5 минут
+RECOMPUTE_HOURS = 48 # задержка ушедшего поезда может уточняться - пересчитываем последние часы
+MAX_DELAY = 24 * 60 # всё, что больше суток, - мусор в данных
+
+delay_stats = {"seen": 0, "recorded": 0, "unchanged": 0, "no_actual": 0, "bad": 0, "written": 0}
+
+
+def _first(item, keys) -> Optional[str]:
+    """Первое непустое поле; item - dict или структура из rzd_decode"""
+    for key in keys:
+        value = item.get(key) if isinstance(item, dict) else getattr(item, key, None)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+class DelayRecorder:
+    """📝 Буфер наблюдений; пишется в БД задачей `flush_delays` в каждом воркере"""
+
+    def __init__(self):
+        self.pending: List[dict] = []
+        # последняя записанная задержка: одинаковые наблюдения каждые 5 минут не нужны
+        self._last = TTLCache(50_000, 2 * 24 * 3600)
+        # наборы полей записей без факта: по ним видно, как поля называются на самом деле
+        self.unknown_schema: Dict[Tuple[str, ...], int] = {}
+
+    def observe(self, train, station_code) -> bool:
+        delay_stats["seen"] += 1
+        try:
+            number, station = _first(train, ("TrainNumber",)), int(station_code)
+            if number is None:
+                raise KeyError("TrainNumber")
+            scheduled = datetime.fromisoformat(_first(train, SCHEDULED_KEYS))
+            if (delay := _first(train, DELAY_KEYS)) is not None:
+                delay = int(delay)
+            elif (actual := _first(train, ACTUAL_KEYS)) is not None:
+                delay = round((datetime.fromisoformat(actual) - scheduled).total_seconds() / 60)
+            else:
+                delay_stats["no_actual"] += 1
+                self._unknown(train)
+                return False
+        except (KeyError, TypeError, ValueError):
+            delay_stats["bad"] += 1
+            return False
+        if abs(delay) > MAX_DELAY:
+            delay_stats["bad"] += 1
+            return False
+
+        key = (number, station, scheduled)
+        if self._last.get(key) == delay:
+            delay_stats["unchanged"] += 1
+            return False
+        self._last.set(key, delay)
+        self.pending.append({
+            "train_number": number, "station_code": station, "scheduled": scheduled,
+            "delay_min": delay, "observed_at": datetime.now(),
+        })
+        delay_stats["recorded"] += 1
+        return True
+
+    def _unknown(self, train):
+        keys = tuple(sorted(train)) if isinstance(train, dict) else tuple(getattr(train, "__struct_fields__", ()))
+        if keys in self.unknown_schema:
+            self.unknown_schema[keys] += 1
+        elif len(self.unknown_schema) < UNKNOWN_SCHEMAS:
+            self.unknown_schema[keys] = 1
+            log.warning("departed_schema_unknown", keys=keys, actual_keys=ACTUAL_KEYS, delay_keys=DELAY_KEYS)
+
+    def stats(self) -> dict:
+        return {
+            **delay_stats,
+            "pending": len(self.pending),
+            "unknown_schema": [{"keys": keys, "count": count} for keys, count in self.unknown_schema.items()],
+        }
+
+    async def flush(self) -> int:
+        rows, self.pending = self.pending, []
+        if not rows:
+            return 0
+        try:
+            async with async_session_maker() as db:
+                await db.execute(insert(Obs), rows) # executemany
+                await db.commit()
+        except Exception:
+            self.pending[:0] = rows # попробуем в следующий раз
+            raise
+        delay_stats["written"] += len(rows)
+        return len(rows)
+
+
+delay_recorder = DelayRecorder()
+
+
+async def flush_delays() -> int:
+    return await delay_recorder.flush()
+
+
+async def rollup_delays() -> dict:
+    """
+    🧮 Пересчитывает свёртки за последние RECOMPUTE_HOURS (идемпотентно: delete + insert) \n
+    По каждому отправлению берётся последнее наблюдение - оно самое точное.
+    """
+    now = datetime.now()
+    since = (now - timedelta(hours=RECOMPUTE_HOURS)).replace(minute=0, second=0, microsecond=0)
+    day_start = datetime.combine(since.date(), datetime.min.time())
+
+    latest = (
+        select(
+            Obs.train_number, Obs.station_code, Obs.scheduled, Obs.delay_min,
+            func.row_number().over(
+                partition_by=(Obs.train_number, Obs.station_code, Obs.scheduled),
+                order_by=Obs.observed_at.desc(),
+            ).label("rn"),
+        )
+        .where(Obs.scheduled >= since) # индекс по scheduled
+        .subquery()
+    )
+    hour = func.strftime("%Y-%m-%d %H:00:00.000000", latest.c.scheduled) # формат DateTime в SQLite
+    hourly = (
+        select(
+            latest.c.train_number, latest.c.station_code, hour,
+            func.count(), func.sum(case((latest.c.delay_min > LATE_MIN, 1), else_=0)),
+            func.sum(latest.c.delay_min), func.max(latest.c.delay_min),
+        )
+        .where(latest.c.rn == 1)
+        .group_by(latest.c.train_number, latest.c.station_code, hour)
+    )
+    daily = (
+        select(
+            Hourly.train_number, Hourly.station_code, func.date(Hourly.hour),
+            func.sum(Hourly.departures), func.sum(Hourly.late), func.sum(Hourly.delay_sum), func.max(Hourly.delay_max),
+        )
+        .where(Hourly.hour >= day_start) # день пересчитываем целиком, из всех его часов
+        .group_by(Hourly.train_number, Hourly.station_code, func.date(Hourly.hour))
+    )
+    columns = ("train_number", "station_code")
+    totals = ("departures", "late", "delay_sum", "delay_max")
+
+    async with engine.begin() as conn:
+        await conn.execute(delete(Hourly).where(Hourly.hour >= since))
+        hours = await conn.execute(insert(Hourly).from_select((*columns, "hour", *totals), hourly))
+        await conn.execute(delete(Daily).where(Daily.day >= since.date()))
+        days = await conn.execute(insert(Daily).from_select((*columns, "day", *totals), daily))
+        purged = await conn.execute(delete(Obs).where(Obs.scheduled < now - timedelta(days=DELAY_RAW_DAYS)))
+        await conn.execute(delete(Hourly).where(Hourly.hour < now - timedelta(days=DELAY_HOURLY_DAYS)))
+    return {"hours": hours.rowcount, "days": days.rowcount, "purged": purged.rowcount}
+
+
+def _summary(departures, late, delay_sum, delay_max) -> dict:
+    departures = departures or 0
+    return {
+        "departures": departures,
+        "avg_delay_min": round(delay_sum / departures, 1) if departures else None,
+        "max_delay_min": delay_max,
+        "late_share": round(late / departures, 3) if departures else None,
+    }
+
+
+_totals = (func.sum(Daily.departures), func.sum(Daily.late), func.sum(Daily.delay_sum), func.max(Daily.delay_max))
+
+
+async def train_delays(db: AsyncSession, number: str, days: int) -> dict:
+    """Средняя задержка поезда за `days` дней: всего, по станциям и по дням (только delay_daily)"""
+    where = and_(Daily.train_number == number, Daily.day >= date.today() - timedelta(days=days))
+    total = (await db.execute(select(*_totals).where(where))).one()
+    stations = await db.execute(select(Daily.station_code, *_totals).where(where).group_by(Daily.station_code))
+    by_day = await db.execute(select(Daily.day, *_totals).where(where).group_by(Daily.day).order_by(Daily.day))
+    return {
+        "train": number,
+        "days": days,
+        **_summary(*total),
+        "stations": [{"code": code, **_summary(*rest)} for code, *rest in stations.all()],
+        "by_day": [{"day": day.isoformat(), **_summary(*rest)} for day, *rest in by_day.all()],
+    }
+
+
+async def station_delays(db: AsyncSession, code: int, days: int, limit: int = 50) -> dict:
+    """Поезда станции за `days` дней, самые опаздывающие сверху"""
+    where = and_(Daily.station_code == code, Daily.day >= date.today() - timedelta(days=days))
+    total = (await db.execute(select(*_totals).where(where))).one()
+    trains = await db.execute(
+        select(Daily.train_number, *_totals)
+        .where(where)
+        .group_by(Daily.train_number)
+        .order_by((func.sum(Daily.delay_sum) * 1.0 / func.sum(Daily.departures)).desc())
+        .limit(limit)
+    )
+    return {
+        "station": code,
+        "days": days,
+        **_summary(*total),
+        "trains": [{"train": number, **_summary(*rest)} for number, *rest in trains.all()],
+    }
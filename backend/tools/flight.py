@@ -0,0 +1,157 @@
+"""
+<| flight.py |>
+Описание:
+общие вызовы к RZD и их отмена, когда клиент ушёл.
+- `@single_flight("routes")`: одинаковые вызовы, пришедшие одновременно, ждут
+  одну задачу; у задачи есть счётчик ждущих
+- ждущий ушёл - счётчик уменьшается; ушёл последний - задача отменяется вместе
+  со своими запросами к RZD. Пока ждёт хоть кто-то, задача (и запись в кэш,
+  которую она сделает) доживает до конца
+- `until_disconnected(req, coro)` отменяет обработку запроса, как только клиент
+  закрыл соединение (ушёл со страницы, набрал следующую букву в поиске станции)
+- `upstream_call(kind)` считает отменённые запросы к RZD и сэкономленное время:
+  сколько в среднем осталось бы ждать такой запрос
+Made with ❤️ by @snowlover4ever
+"""
+
+import asyncio
+import functools
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from starlette.requests import Request
+
+cancel_stats = {"disconnects": 0, "upstream_cancelled": 0, "saved_sec": 0.0}
+_upstream_avg: Dict[str, float] = {} # скользящее среднее длительности по типу запроса, с
+AVG_WEIGHT = 0.1
+
+
+@contextmanager
+def upstream_call(kind: str):
+    """Оборачивает один запрос к RZD: длительность -> среднее, отмена -> cancel_stats"""
+    start = perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        cancel_stats["upstream_cancelled"] += 1
+        cancel_stats["saved_sec"] += max(_upstream_avg.get(kind, 0.0) - (perf_counter() - start), 0.0)
+        raise
+    else: # ошибки (таймауты и т.п.) в среднее не берём
+        elapsed = perf_counter() - start
+        avg = _upstream_avg.get(kind, elapsed)
+        _upstream_avg[kind] = avg + AVG_WEIGHT * (elapsed - avg)
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class Flight:
+    """✈️ Один выполняющийся вызов на ключ; отменяется, когда не осталось ждущих"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._running: Dict[Hashable, _Call] = {}
+        self._stats = {"started": 0, "joined": 0, "cancelled": 0, "kept": 0}
+
+    async def run(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args) -> Any:
+        call = self._running.get(key)
+        if call is None:
+            call = self._running[key] = _Call(asyncio.create_task(fn(*args)))
+            call.task.add_done_callback(functools.partial(self._done, key, call))
+            self._stats["started"] += 1
+        else:
+            self._stats["joined"] += 1
+
+        call.waiters += 1
+        try:
+            # shield: отмена ждущего не должна сама по себе отменять общую задачу
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.task.done():
+                if call.waiters == 0:
+                    # ключ освобождаем сразу: пока задача сворачивается (httpx закрывает
+                    # соединение), такой же новый запрос должен начать свой вызов, а не
+                    # присоединиться к отменённому и получить CancelledError
+                    self._forget(key, call)
+                    call.task.cancel() # результат больше никому не нужен
+                    self._stats["cancelled"] += 1
+                else:
+                    self._stats["kept"] += 1 # ушли мы, но его ждут другие
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._running.get(key) is call:
+            del self._running[key]
+
+    def _done(self, key: Hashable, call: _Call, task: asyncio.Task):
+        self._forget(key, call)
+        if not task.cancelled():
+            task.exception() # ошибку уже получили ждущие; иначе asyncio ругнётся в лог
+
+    def stats(self) -> dict:
+        return {**self._stats, "running": len(self._running)}
+
+
+flights: Dict[str, Flight] = {}
+
+
+def single_flight(name: str, key: Optional[Callable[..., Hashable]] = None):
+    """
+    Декоратор для async-функций с позиционными аргументами (ставится над @cached) 
+
+    `key(*args)` - ключ вызова, если не все аргументы на него влияют; по умолчанию - все аргументы.
+    """
+    def decorator(fn):
+        flight = flights[name] = Flight(name)
+
+        @functools.wraps(fn)
+        async def wrapper(*args):
+            return await flight.run(key(*args) if key else args, fn, *args)
+        return wrapper
+    return decorator
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def _wait_disconnect(req: Request):
+    # тело GET-запроса уже пришло, дальше receive() ждёт только http.disconnect
+    while (await req.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def until_disconnected(req: Request, aw: Awaitable[Any]) -> Any:
+    """
+    🔌 Ждёт `aw`, пока клиент на связи \n
+    Клиент отключился - `aw` отменяется (и с ним всё, что нужно было только ему),
+    а наружу летит ClientDisconnected.
+    """
+    work = asyncio.ensure_future(aw)
+    watch = asyncio.create_task(_wait_disconnect(req))
+    try:
+        await asyncio.wait((work, watch), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # сюда попадаем и когда отменили нас самих (сервер гасит запрос)
+        watch.cancel()
+        if not work.done():
+            work.cancel()
+    if work.done() and not work.cancelled():
+        return work.result()
+    cancel_stats["disconnects"] += 1
+    raise ClientDisconnected()
+
+
+def flight_stats() -> dict:
+    return {
+        **cancel_stats,
+        "saved_sec": round(cancel_stats["saved_sec"], 3),
+        "upstream_avg_sec": {kind: round(avg, 3) for kind, avg in _upstream_avg.items()},
+        "flights": {name: f.stats() for name, f in flights.items()},
+    }
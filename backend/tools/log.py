@@ -0,0 +1,156 @@
+"""
+<| log.py |>
+Описание:
+структурированные логи, которые почти ничего не стоят в горячем пути.
+- вызов `log.info(...)` только кладёт запись в ограниченную очередь (put_nowait);
+  форматирование в JSON и запись в stdout / файл делает поток QueueListener
+- очередь переполнена - запись выбрасывается и считается, event loop не ждёт никогда
+- уровень: env `log_level`; выборка для шумных событий: env `log_sample`
+  (например `fallback_route=0.05,delay_bad=0.1` - пишем 5% / 10%)
+- в каждую запись попадает request_id текущего запроса (его ставит metrics.py)
+
+Пример:
+    log = get_logger("rzd")
+    log.info("fallback_route", train=train_num, route=fallback)
+Made with ❤️ by @snowlover4ever
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+
+from backend.tools.constant import (LOG_LEVEL, LOG_FILE, LOG_QUEUE, LOG_SAMPLE)
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+log_stats = {"queued": 0, "dropped": 0, "sampled_out": 0}
+
+
+def _parse_sampling(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        event, _, rate = part.partition("=")
+        try:
+            rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+SAMPLING = _parse_sampling(LOG_SAMPLE)
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON (работает в потоке слушателя)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, "event", None) or record.getMessage(),
+        }
+        if (rid := getattr(record, "request_id", None)):
+            data["request_id"] = rid
+        if (rate := getattr(record, "sample_rate", None)) is not None:
+            data["sample_rate"] = rate # чтобы при подсчёте умножить обратно
+        data.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не блокирует и не форматирует в вызывающем потоке"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record # форматирует слушатель; процессы не пересекаются - pickle не нужен
+
+    def enqueue(self, record: logging.LogRecord):
+        _ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+            log_stats["queued"] += 1
+        except queue.Full:
+            log_stats["dropped"] += 1
+
+
+_queue: queue.Queue = queue.Queue(LOG_QUEUE)
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_lock = threading.Lock()
+
+
+def _output() -> logging.Handler:
+    handler = logging.FileHandler(LOG_FILE, encoding="utf-8") if LOG_FILE else logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _ensure_listener():
+    # поток запускаем при первой записи, а не при импорте
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = logging.handlers.QueueListener(_queue, _output(), respect_handler_level=False)
+                _listener.start()
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает поток (lifespan / atexit)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(stop_logging)
+
+_root = logging.getLogger("loltrains")
+_root.setLevel(LOG_LEVEL)
+_root.addHandler(_DroppingQueueHandler(_queue))
+_root.propagate = False # uvicorn настраивает корневой логгер по-своему
+
+
+class Log:
+    """Обёртка над logging.Logger: событие + именованные поля, уровень и выборка проверяются до создания записи"""
+
+    __slots__ = ("logger",)
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def _log(self, level: int, event: str, exc_info, fields: dict):
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = SAMPLING.get(event)
+        if rate is not None and random.random() >= rate:
+            log_stats["sampled_out"] += 1
+            return
+        self.logger.log(level, event, exc_info=exc_info, extra={
+            "event": event, "fields": fields, "request_id": request_id.get(), "sample_rate": rate,
+        })
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, None, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, None, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, None, fields)
+
+    def error(self, event: str, exc_info=None, **fields):
+        self._log(logging.ERROR, event, exc_info, fields)
+
+
+def get_logger(name: str) -> Log:
+    return Log(_root.getChild(name))
@@ -0,0 +1,89 @@
+"""
+<| maintenance.py |>
+Описание:
+фоновые задачи обслуживания БД и кэшей для `scheduler`.
+Made with ❤️ by @snowlover4ever
+"""
+
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import (delete, select, text)
+
+from backend.models.database import (async_session_maker, engine)
+from backend.models.Linked import LinkedTrainModel
+from backend.models.User import User
+from backend.tools.constant import (LINKED_PURGE_EVERY, DB_OPTIMIZE_EVERY, DB_VACUUM_EVERY, PROFILE_WARMUP_EVERY,
+                                   VARIANTS_EVERY, PRECOMPRESS_EVERY, MEDIA_GC_EVERY, DELAY_FLUSH_EVERY, DELAY_ROLLUP_EVERY)
+from backend.tools.scheduler import scheduler
+from backend.tools.user.profile import warm_profiles
+from backend.tools.media.variants import render_missing
+from backend.tools.random.imgs import get_all_defaults
+from backend.tools.media.serving import precompress
+from backend.tools.media.gc import collect_media_garbage
+from backend.tools.delays import (flush_delays, rollup_delays)
+
+PURGE_BATCH = 500 # строк за один DELETE, чтобы не держать блокировку БД долго
+
+
+async def purge_expired_links() -> int:
+    """Удаляет привязки к поездам, у которых прошло `arrival_time`."""
+    now, deleted = datetime.now(), 0
+    expired = (
+        select(LinkedTrainModel.id)
+        .where(LinkedTrainModel.arrival_time < now) # идёт по индексу arrival_time
+        .limit(PURGE_BATCH)
+        .scalar_subquery()
+    )
+    while True:
+        async with async_session_maker() as db:
+            result = await db.execute(delete(LinkedTrainModel).where(LinkedTrainModel.id.in_(expired)))
+            await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < PURGE_BATCH:
+            return deleted
+        await asyncio.sleep(0) # даём поработать запросам между пачками
+
+
+async def optimize_db():
+    """Обновляет статистику планировщика запросов SQLite."""
+    async with engine.connect() as conn:
+        await conn.execute(text("PRAGMA optimize"))
+
+
+async def vacuum_db():
+    """Пересобирает файл БД и отдаёт освободившееся место (VACUUM вне транзакции)."""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM"))
+
+
+async def warmup_profiles() -> int:
+    async with async_session_maker() as db:
+        return await warm_profiles(db)
+
+
+async def render_variants() -> int:
+    """Дорисовывает варианты для всех используемых аватарок и баннеров (в т.ч. defaults)."""
+    photos, banners = get_all_defaults()
+    async with async_session_maker() as db:
+        photos = {*photos, *(await db.execute(select(User.photo).distinct())).scalars().all()}
+        banners = {*banners, *(await db.execute(select(User.banner).distinct())).scalars().all()}
+    return await render_missing([*((url, "photos") for url in photos), *((url, "profileb") for url in banners)])
+
+
+async def precompress_media() -> dict:
+    """Готовит .gz / .br для SVG и других несжатых файлов в media."""
+    return await asyncio.to_thread(precompress)
+
+
+def register_jobs():
+    scheduler.add("purge_expired_links", LINKED_PURGE_EVERY, purge_expired_links, run_at_start=True)
+    scheduler.add("optimize_db", DB_OPTIMIZE_EVERY, optimize_db)
+    scheduler.add("vacuum_db", DB_VACUUM_EVERY, vacuum_db)
+    scheduler.add("warmup_profiles", PROFILE_WARMUP_EVERY, warmup_profiles, run_at_start=True, everywhere=True) # кэш у каждого воркера свой
+    scheduler.add("render_variants", VARIANTS_EVERY, render_variants, run_at_start=True)
+    scheduler.add("precompress_media", PRECOMPRESS_EVERY, precompress_media, run_at_start=True)
+    scheduler.add("media_gc", MEDIA_GC_EVERY, collect_media_garbage)
+    scheduler.add("flush_delays", DELAY_FLUSH_EVERY, flush_delays, everywhere=True) # буфер у каждого воркера свой
+    scheduler.add("rollup_delays", DELAY_ROLLUP_EVERY, rollup_delays)
@@ -0,0 +1,183 @@
+"""
+<| gc.py |>
+Описание:
+сборщик мусора для media (mark & sweep).
+mark  - собираем все URL файлов, на которые ссылается БД
+sweep - обходим загруженные файлы на диске, ненужные сначала уносим
+        в карантин, а через QUARANTINE_DAYS удаляем насовсем.
+Перед переносом mtime проверяется ещё раз под исключительной `store_lock`:
+повторная загрузка того же файла (storage.py) освежает его под той же блокировкой.
+Made with ❤️ by @snowlover4ever
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, List, Set
+
+from sqlalchemy import select
+
+from backend.models.database import (async_session_maker, AsyncSession)
+from backend.models.User import User
+from backend.tools.media.storage import (MEDIA_ROOT, MEDIA_URL, TMP_DIR, store_lock)
+from backend.tools.media.variants import VARIANTS_DIR
+from backend.tools.log import get_logger
+
+QUARANTINE_DIR = Path(".media_quarantine") # вне media, чтобы не раздавалось наружу
+MANAGED_DIRS = ("store", "photos", "profileb", "chat_attachments", "variants") # defaults/public не трогаем
+GRACE = 3600 # сек - свежие файлы не трогаем (загрузка могла ещё не дойти до commit)
+QUARANTINE_DAYS = 7
+BATCH = 200
+
+log = get_logger("media.gc")
+
+# откуда брать ссылки на файлы: async (db) -> URL-ы
+_reference_sources: List[Callable[[AsyncSession], Awaitable[Iterable[str]]]] = []
+
+
+def register_references(source: Callable[[AsyncSession], Awaitable[Iterable[str]]]):
+    """📎 Добавляет источник ссылок на media (новые таблицы с вложениями регистрируются здесь)"""
+    _reference_sources.append(source)
+    return source
+
+
+@register_references
+async def _user_images(db: AsyncSession) -> Iterable[str]:
+    rows = await db.execute(select(User.photo, User.banner))
+    return [url for row in rows.all() for url in row if url]
+
+
+async def _mark() -> Set[str]:
+    """Пути (относительно media) всех файлов, на которые есть ссылки."""
+    marked = set()
+    async with async_session_maker() as db:
+        for source in _reference_sources:
+            for url in await source(db):
+                if url.startswith(f"{MEDIA_URL}/"):
+                    marked.add(url[len(MEDIA_URL) + 1:])
+    return marked
+
+
+def _variant_source(rel: str) -> str:
+    """variants/store/ab/<hash>.96.webp -> store/ab/<hash> (путь оригинала без расширения)"""
+    return rel[len(VARIANTS_DIR.name) + 1:].rsplit(".", 2)[0]
+
+
+def _scan(marked: Set[str]) -> tuple:
+    """Синхронно: файлы без ссылок + статистика дублей."""
+    now = time.time()
+    marked_stems = {str(Path(rel).with_suffix("")) for rel in marked}
+    garbage, by_size, stats = [], defaultdict(list), {"scanned": 0, "referenced": 0, "too_fresh": 0}
+
+    for folder in MANAGED_DIRS:
+        for path in (MEDIA_ROOT / folder).rglob("*"):
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            stats["scanned"] += 1
+            st = path.stat()
+            rel = path.relative_to(MEDIA_ROOT).as_posix()
+            if folder != "variants":
+                by_size[st.st_size].append(path)
+
+            if folder == "variants":
+                source = _variant_source(rel)
+                # варианты defaults/public нужны всегда - их выдают новым пользователям
+                used = source in marked_stems or source.split("/", 1)[0] not in MANAGED_DIRS
+            else:
+                used = rel in marked or (path.suffix in (".gz", ".br") and rel[:-3] in marked)
+            if used:
+                stats["referenced"] += 1
+            elif now - st.st_mtime < GRACE:
+                stats["too_fresh"] += 1
+            else:
+                garbage.append((rel, st.st_size))
+
+    # дубли: сначала по размеру, хэш считаем только при совпадении размеров
+    duplicates, duplicate_bytes = 0, 0
+    for size, paths in by_size.items():
+        if len(paths) < 2:
+            continue
+        hashes = defaultdict(int)
+        for path in paths:
+            hashes[hashlib.sha256(path.read_bytes()).hexdigest()] += 1
+        for count in hashes.values():
+            duplicates += count - 1
+            duplicate_bytes += (count - 1) * size
+
+    return garbage, {**stats, "duplicates": duplicates, "duplicate_bytes": duplicate_bytes}
+
+
+def _quarantine(batch: list) -> tuple:
+    moved, moved_bytes, revived = 0, 0, 0
+    with store_lock(exclusive=True): # загрузки ждут: между проверкой и переносом файл никто не переиспользует
+        now = time.time()
+        for rel, size in batch:
+            src, dest = MEDIA_ROOT / rel, QUARANTINE_DIR / rel
+            try:
+                if now - src.stat().st_mtime < GRACE:
+                    revived += 1 # после _scan файл загрузили ещё раз - ссылка на него вот-вот появится
+                    continue
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(src, dest)
+                os.utime(dest) # mtime = время попадания в карантин
+                moved += 1
+                moved_bytes += size
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                log.warning("quarantine_failed", path=rel, error=repr(e))
+    return moved, moved_bytes, revived
+
+
+def _purge_quarantine(marked: Set[str]) -> dict:
+    """Удаляет старое из карантина; то, на что снова появилась ссылка, возвращает обратно."""
+    now, result = time.time(), {"restored": 0, "deleted": 0, "bytes_reclaimed": 0}
+    for path in QUARANTINE_DIR.rglob("*") if QUARANTINE_DIR.exists() else ():
+        if not path.is_file():
+            continue
+        rel = path.relative_to(QUARANTINE_DIR).as_posix()
+        if rel in marked:
+            (MEDIA_ROOT / rel).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, MEDIA_ROOT / rel)
+            result["restored"] += 1
+        elif now - path.stat().st_mtime > QUARANTINE_DAYS * 86400:
+            result["bytes_reclaimed"] += path.stat().st_size
+            path.unlink()
+            result["deleted"] += 1
+
+    # недокачанные загрузки
+    if TMP_DIR.exists():
+        for path in TMP_DIR.glob("*.part"):
+            if now - path.stat().st_mtime > GRACE:
+                result["bytes_reclaimed"] += path.stat().st_size
+                path.unlink(missing_ok=True)
+                result["deleted"] += 1
+    return result
+
+
+async def collect_media_garbage() -> dict:
+    """
+    🧹 Один проход сборщика мусора \n
+    return отчёт: сколько просмотрено / в карантине / удалено / освобождено байт / дублей
+    """
+    marked = await _mark()
+    garbage, report = await asyncio.to_thread(_scan, marked)
+
+    quarantined, quarantined_bytes, revived = 0, 0, 0
+    for start in range(0, len(garbage), BATCH):
+        moved, moved_bytes, fresh = await asyncio.to_thread(_quarantine, garbage[start:start + BATCH])
+        quarantined += moved
+        quarantined_bytes += moved_bytes
+        revived += fresh
+        await asyncio.sleep(0)
+
+    return {
+        **report,
+        "quarantined": quarantined,
+        "quarantined_bytes": quarantined_bytes,
+        "revived": revived,
+        **await asyncio.to_thread(_purge_quarantine, marked),
+    }
@@ -0,0 +1,206 @@
+"""
+<| serving.py |>
+Описание:
+раздача /media с долгим кэшированием.
+- файлы с хэшем / временем в имени никогда не меняются -> Cache-Control: immutable
+- сильный ETag по содержимому (sha256), а не по mtime
+- заранее сжатые копии (.br / .gz) для SVG и других несжатых форматов
+- Range и zero-copy (ASGI `http.response.pathsend`) даёт FileResponse из starlette
+Made with ❤️ by @snowlover4ever
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import (FileResponse, Response)
+from starlette.types import Scope
+
+from backend.tools.cache import TTLCache
+from backend.tools.media.storage import MEDIA_ROOT
+
+try:
+    import brotli
+except ImportError: # pragma: no cover
+    brotli = None
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+mimetypes.add_type("image/svg+xml", ".svg")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=86400, stale-while-revalidate=604800"
+
+# store/ и variants/ - имя = sha256; старые загрузки - {user}_{folder}_{timestamp}.ext
+HASHED_NAME = re.compile(r"^(?P<hash>[0-9a-f]{64})(\.\d+)?\.[a-z0-9]+$")
+TIMESTAMPED_NAME = re.compile(r"_\d{9,}\.\d+\.[A-Za-z0-9]+$")
+
+COMPRESSIBLE = {".svg", ".bmp", ".ico", ".tif", ".tiff", ".json", ".txt", ".css", ".js"}
+ENCODINGS = (("br", ".br"), ("gzip", ".gz")) # в порядке предпочтения
+
+media_stats = {"served": 0, "not_modified": 0, "precompressed": 0, "hashed": 0}
+
+
+class _Meta:
+    """Что мы знаем о файле на диске (пересчитывается, если поменялся mtime / размер)"""
+    __slots__ = ("key", "etag", "immutable", "encoded")
+
+    def __init__(self, key, etag: str, immutable: bool, encoded: Dict[str, Tuple[str, os.stat_result]]):
+        self.key = key
+        self.etag = etag
+        self.immutable = immutable
+        self.encoded = encoded
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    """
+    "br;q=0.8, gzip, *;q=0" -> {"br": 0.8, "gzip": 1.0, "*": 0.0} \n
+    Битый q считается нулём - такое кодирование не отдаём.
+    """
+    accepted = {}
+    for item in header.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def _pick_encoding(header: str, available) -> Optional[str]:
+    """Кодирование с наибольшим q из тех, что есть на диске; при равенстве - по ENCODINGS"""
+    accepted = _accepted_encodings(header)
+    best, best_q = None, 0.0
+    for encoding, _ in ENCODINGS:
+        if encoding not in available:
+            continue
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    media_stats["hashed"] += 1
+    return digest.hexdigest()
+
+
+class MediaFiles(StaticFiles):
+    """
+    📦 StaticFiles для /media с правильными заголовками кэширования \n
+    Вся работа с диском (stat, хэш) идёт в `lookup_path`, который starlette
+    и так запускает в потоке.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._meta = TTLCache(16384, 24 * 3600)
+        self._lock = threading.Lock() # lookup_path работает в потоках
+
+    def lookup_path(self, path: str) -> Tuple[str, Optional[os.stat_result]]:
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None and Path(full_path).suffix not in (".br", ".gz"):
+            self._describe(full_path, stat_result)
+        return full_path, stat_result
+
+    def _describe(self, full_path: str, stat_result: os.stat_result) -> _Meta:
+        key = (stat_result.st_mtime_ns, stat_result.st_size)
+        with self._lock:
+            meta = self._meta.get(full_path)
+        if meta is not None and meta.key == key:
+            return meta
+
+        name = os.path.basename(full_path)
+        if (hashed := HASHED_NAME.match(name)):
+            etag, immutable = name if hashed.group(2) else hashed.group("hash"), True
+        else:
+            etag, immutable = _file_hash(full_path), bool(TIMESTAMPED_NAME.search(name))
+
+        encoded = {}
+        if Path(full_path).suffix.lower() in COMPRESSIBLE:
+            for encoding, ext in ENCODINGS:
+                try:
+                    encoded[encoding] = (full_path + ext, os.stat(full_path + ext))
+                except OSError:
+                    continue
+
+        meta = _Meta(key, etag, immutable, encoded)
+        with self._lock:
+            self._meta.set(full_path, meta)
+        return meta
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        meta = self._describe(str(full_path), stat_result) # уже посчитано в lookup_path
+
+        headers = {"cache-control": IMMUTABLE if meta.immutable else REVALIDATE}
+        etag, path = meta.etag, full_path
+        if meta.encoded:
+            headers["vary"] = "Accept-Encoding"
+            encoding = _pick_encoding(request_headers.get("accept-encoding", ""), meta.encoded)
+            if encoding:
+                path, stat_result = meta.encoded[encoding]
+                headers["content-encoding"] = encoding
+                etag = f"{etag}-{encoding}"
+                media_stats["precompressed"] += 1
+        headers["etag"] = f'"{etag}"'
+
+        response = FileResponse(
+            path, status_code=status_code, headers=headers, stat_result=stat_result,
+            media_type=mimetypes.guess_type(str(full_path))[0],
+        )
+        response.chunk_size = 256 * 1024 # если сервер не умеет pathsend - меньше итераций
+        if self.is_not_modified(response.headers, request_headers):
+            media_stats["not_modified"] += 1
+            return _not_modified(response.headers)
+        media_stats["served"] += 1
+        return response
+
+
+def _not_modified(headers: Headers) -> Response:
+    keep = ("cache-control", "content-location", "date", "etag", "expires", "vary", "content-encoding")
+    return Response(status_code=304, headers={k: v for k, v in headers.items() if k in keep})
+
+
+def precompress(root: Path = MEDIA_ROOT) -> dict:
+    """Создаёт .gz (и .br, если есть brotli) рядом со сжимаемыми файлами."""
+    made = {"files": 0, "bytes_before": 0, "bytes_after": 0}
+    for path in root.rglob("*"):
+        if path.suffix.lower() not in COMPRESSIBLE or not path.is_file():
+            continue
+        data = None
+        for encoding, ext in ENCODINGS:
+            if encoding == "br" and brotli is None:
+                continue
+            target = path.with_name(path.name + ext)
+            if target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+                continue
+            data = data if data is not None else path.read_bytes()
+            packed = brotli.compress(data, quality=11) if encoding == "br" else gzip.compress(data, 9, mtime=0)
+            if len(packed) >= len(data) * 0.9:
+                continue # сжимать нечего
+            tmp = target.with_name(f".{target.name}.tmp")
+            tmp.write_bytes(packed)
+            os.replace(tmp, target)
+            made["files"] += 1
+            made["bytes_before"] += len(data)
+            made["bytes_after"] += len(packed)
+    return made
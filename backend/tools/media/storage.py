@@ -0,0 +1,156 @@
+"""
+<| storage.py |>
+Описание:
+приём загруженных файлов: потоково пишем на диск вне event loop,
+проверяем размер и тип на лету и считаем sha256.
+Файлы хранятся по хэшу содержимого (media/store/ab/abcd...ext),
+поэтому одинаковые картинки лежат на диске один раз.
+Повторная загрузка уже лежащего файла обновляет его mtime под общей
+блокировкой `store_lock` - сборщик мусора (gc.py) уносит файлы в карантин
+под исключительной и свежие не трогает.
+Made with ❤️ by @snowlover4ever
+"""
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError: # Windows - там и воркер один (режим разработки)
+    fcntl = None
+
+from fastapi import UploadFile
+
+from backend.tools.pool import BoundedPool
+
+MEDIA_ROOT = Path("media")
+STORE_DIR = MEDIA_ROOT / "store"
+TMP_DIR = MEDIA_ROOT / "tmp"
+MEDIA_URL = "/api/media"
+STORE_LOCK = Path(".media_store.lock") # вне media, чтобы не раздавался наружу
+
+CHUNK = 256 * 1024
+MB = 1024 * 1024
+LIMITS = { # максимальный размер по типу загрузки
+    "photos": 5 * MB,
+    "profileb": 10 * MB,
+    "chat_attachments": 20 * MB,
+}
+
+# сигнатуры разрешённых форматов: (смещение, байты) -> расширение
+SIGNATURES = [
+    ((0, b"\x89PNG\r\n\x1a\n"), ".png"),
+    ((0, b"\xff\xd8\xff"), ".jpg"),
+    ((0, b"GIF87a"), ".gif"),
+    ((0, b"GIF89a"), ".gif"),
+    ((8, b"WEBP"), ".webp"),
+    ((8, b"avif"), ".avif"),
+    ((8, b"avis"), ".avif"),
+]
+
+upload_pool = BoundedPool("upload", 4, 16)
+upload_stats = {"stored": 0, "deduplicated": 0, "rejected": 0, "bytes_written": 0, "bytes_saved": 0}
+
+
+class UploadRejected(Exception):
+    """Файл не прошёл проверку. `status` - код для фронта, `http` - код ответа."""
+
+    def __init__(self, status: str, http: int):
+        super().__init__(status)
+        self.status = status
+        self.http = http
+
+
+@contextmanager
+def store_lock(exclusive: bool = False):
+    """
+    🔒 flock на хранилище, общий для всех воркеров \n
+    Загрузки берут общую блокировку, сборщик мусора - исключительную.
+    Блокирующий вызов - только из потоков (upload_pool / to_thread).
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(STORE_LOCK, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _sniff(head: bytes) -> Optional[str]:
+    for (offset, magic), ext in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return ext
+    return None
+
+
+def _ingest(src: BinaryIO, kind: str) -> Tuple[str, int]:
+    """Синхронная часть: копирует поток во временный файл и раскладывает по хэшу."""
+    limit = LIMITS[kind]
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".part", dir=TMP_DIR)
+    tmp = Path(tmp)
+
+    digest, size, ext = hashlib.sha256(), 0, None
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := src.read(CHUNK):
+                if ext is None and not (ext := _sniff(chunk[:16])):
+                    raise UploadRejected("FT", 415) # File Type
+                size += len(chunk)
+                if size > limit:
+                    raise UploadRejected("TB", 413) # Too Big
+                digest.update(chunk)
+                out.write(chunk)
+
+        if ext is None:
+            raise UploadRejected("FT", 415) # пустой файл
+
+        name = digest.hexdigest()
+        dest = STORE_DIR / name[:2] / f"{name}{ext}"
+        with store_lock():
+            try:
+                # файл мог давно лежать без ссылок: свежий mtime - сборщик мусора
+                # не унесёт его в карантин, пока эта загрузка не дойдёт до commit
+                os.utime(dest)
+                deduplicated = True
+            except FileNotFoundError:
+                deduplicated = False
+            if deduplicated:
+                upload_stats["deduplicated"] += 1
+                upload_stats["bytes_saved"] += size
+                tmp.unlink()
+            else:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                os.chmod(tmp, 0o644) # mkstemp создаёт 0600
+                os.replace(tmp, dest)
+                upload_stats["stored"] += 1
+                upload_stats["bytes_written"] += size
+        return dest.relative_to(MEDIA_ROOT).as_posix(), size
+    except BaseException:
+        upload_stats["rejected"] += 1
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+async def ingest_upload(file: UploadFile, kind: str) -> Optional[str]:
+    """
+    📥 Сохраняет загруженный файл и возвращает его URL \n
+    Бросает `UploadRejected` (размер/тип) или `PoolBusy` (слишком много загрузок).
+    """
+    if not file or not file.filename:
+        return None
+
+    path, _ = await upload_pool.run(_ingest, file.file, kind)
+    return f"{MEDIA_URL}/{path}"
+
+
+def is_stored(url: Optional[str]) -> bool:
+    """Лежит ли файл в хранилище по хэшу (его может использовать кто-то ещё)"""
+    return bool(url) and url.startswith(f"{MEDIA_URL}/{STORE_DIR.name}/")
@@ -0,0 +1,195 @@
+"""
+<| metrics.py |>
+Описание:
+замеры на каждый запрос:
+- гистограмма задержек по шаблону маршрута (`/profile/info`, а не `/profile/info?who=...`)
+- сколько SQL-запросов сделал запрос и сколько они заняли (события движка SQLAlchemy)
+- сколько времени ушло на внешние вызовы (хуки httpx-клиента rzd_api)
+Итог запроса уходит клиенту в заголовке `Server-Timing`, сводка - в /stats.
+Made with ❤️ by @snowlover4ever
+"""
+
+import bisect
+import re
+import uuid
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import (ASGIApp, Message, Receive, Scope, Send)
+
+from backend.tools import profiler
+from backend.tools.log import request_id
+
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+UNMATCHED = "unmatched" # 404 и прочее - не плодим ключи на каждый мусорный путь
+REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$") # X-Request-ID от прокси берём, только если он приличный
+
+
+class RequestMetrics:
+    """Счётчики одного запроса (лежат в contextvar)"""
+    __slots__ = ("queries", "db_time", "upstream_calls", "upstream_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.upstream_calls = 0
+        self.upstream_time = 0.0
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+class Histogram:
+    """📊 Гистограмма с фиксированными корзинами (мс) + итоги по БД и внешним вызовам"""
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.queries = 0
+        self.db_time = 0.0
+        self.upstream_time = 0.0
+
+    def observe(self, ms: float, metrics: RequestMetrics, status: int):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.errors += status >= 500
+        self.queries += metrics.queries
+        self.db_time += metrics.db_time
+        self.upstream_time += metrics.upstream_time
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Верхняя граница корзины, в которую попал q-й перцентиль"""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else round(self.max, 2)
+        return round(self.max, 2)
+
+    def stats(self) -> dict:
+        n = self.count or 1
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total / n, 2),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max, 2),
+            "queries_per_req": round(self.queries / n, 2),
+            "db_ms_per_req": round(self.db_time * 1000 / n, 2),
+            "upstream_ms_per_req": round(self.upstream_time * 1000 / n, 2),
+            "buckets": dict(zip([*map(str, BUCKETS_MS), "inf"], self.counts)),
+        }
+
+
+routes: Dict[str, Histogram] = {}
+
+
+def route_stats() -> dict:
+    return {key: hist.stats() for key, hist in sorted(routes.items())}
+
+
+# ---------- SQLAlchemy ----------
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = perf_counter() # соединение выполняет один запрос за раз
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    if (metrics := _current.get()) is not None:
+        metrics.queries += 1
+        metrics.db_time += perf_counter() - conn.info["query_start"]
+
+
+def track_queries(engine: AsyncEngine):
+    """Подписывается на выполнение запросов (события вешаются на sync_engine)"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_execute)
+
+
+# ---------- httpx ----------
+
+async def _on_request(request: httpx.Request):
+    request.extensions["started"] = perf_counter()
+
+
+async def _on_response(response: httpx.Response):
+    await response.aread() # тело всё равно читается дальше - считаем и его
+    if (metrics := _current.get()) is not None and "started" in response.request.extensions:
+        metrics.upstream_calls += 1
+        metrics.upstream_time += perf_counter() - response.request.extensions["started"]
+
+
+def upstream_hooks() -> dict:
+    """event_hooks для httpx.AsyncClient"""
+    return {"request": [_on_request], "response": [_on_response]}
+
+
+# ---------- middleware ----------
+
+class RequestMetricsMiddleware:
+    """
+    ⏱️ ASGI-middleware: время запроса, SQL и внешние вызовы -> гистограмма + `Server-Timing` \n
+    Заодно выдаёт запросу request_id (или берёт X-Request-ID от прокси) для логов. \n
+    Сделан на чистом ASGI (не BaseHTTPMiddleware), чтобы не добавлять задачу
+    на каждый запрос и не ломать стриминг ответов.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        rid = incoming if REQUEST_ID.match(incoming) else uuid.uuid4().hex[:16]
+        rid_token = request_id.set(rid) # попадёт в каждую запись лога этого запроса
+        session = profiler.start(scope)
+        start, status = perf_counter(), 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", _server_timing(metrics, perf_counter() - start))
+                headers.append("X-Request-ID", rid)
+                if session is not None:
+                    headers.append("X-Profile", session.name)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = (perf_counter() - start) * 1000
+            _current.reset(token)
+            request_id.reset(rid_token)
+            if session is not None:
+                profiler.stop(session)
+            route = scope.get("route")
+            key = f"{scope['method']} {route.path}" if route is not None else UNMATCHED
+            routes.setdefault(key, Histogram()).observe(elapsed, metrics, status)
+
+
+def _server_timing(metrics: RequestMetrics, elapsed: float) -> str:
+    return (
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries", '
+        f'upstream;dur={metrics.upstream_time * 1000:.1f};desc="{metrics.upstream_calls} calls", '
+        f"app;dur={elapsed * 1000:.1f}"
+    )
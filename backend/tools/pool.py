@@ -0,0 +1,70 @@
+"""
+<| pool.py |>
+Описание:
+ограниченный пул потоков для тяжёлой синхронной работы (bcrypt, картинки),
+чтобы она не блокировала event loop.
+Made with ❤️ by @snowlover4ever
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Callable
+
+
+class PoolBusy(Exception):
+    """Очередь пула переполнена - запрос лучше отклонить сразу, чем ждать."""
+
+
+class BoundedPool:
+    """
+    🧵 Пул потоков с контролем допуска \n
+    Одновременно выполняется `workers` задач, ещё `queue_limit` могут ждать.
+    Всё, что сверху, сразу получает `PoolBusy`.
+    """
+
+    def __init__(self, name: str, workers: int, queue_limit: int):
+        self.name = name
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.inflight = 0
+        self.done = 0
+        self.rejected = 0
+        self.busy_time = 0.0
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # создаём лениво, чтобы потоки не плодились при импорте
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        if self.inflight >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise PoolBusy(self.name)
+
+        self.inflight += 1
+        start = perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.inflight -= 1
+            self.done += 1
+            self.busy_time += perf_counter() - start
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "inflight": self.inflight,
+            "done": self.done,
+            "rejected": self.rejected,
+            "avg_ms": round(self.busy_time / self.done * 1000, 2) if self.done else None,
+        }
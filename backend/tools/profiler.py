@@ -0,0 +1,83 @@
+"""
+<| profiler.py |>
+Описание:
+сэмплирующий профилировщик по запросу.
+Включается env `profiling=1`, дальше любой запрос с заголовком `X-Profile: 1`
+профилируется: отдельный поток раз в PROFILE_INTERVAL мс снимает стек потока
+event loop (`sys._current_frames`) и пишет результат в collapsed-формате
+(`a;b;c 42`), который понимают flamegraph.pl / speedscope / inferno.
+Event loop один на все запросы, поэтому в профиль попадает и соседняя работа -
+снимать лучше на тихом стенде. Одновременно идёт только одна сессия.
+Made with ❤️ by @snowlover4ever
+"""
+
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from starlette.types import Scope
+
+from backend.tools.constant import (PROFILING, PROFILE_DIR, PROFILE_INTERVAL)
+
+HEADER = b"x-profile"
+MAX_DEPTH = 128
+
+_active: Optional["Session"] = None
+profiler_stats = {"sessions": 0, "skipped_busy": 0, "samples": 0}
+
+
+class Session:
+    """Одна сессия: поток-сэмплер + счётчик стеков"""
+
+    def __init__(self, scope: Scope):
+        path = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        self.name = f"{datetime.now():%Y%m%d-%H%M%S-%f}_{scope['method']}_{path}.folded"
+        self.stacks: Counter = Counter()
+        self.target = threading.get_ident() # поток event loop
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.target)
+        stack = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self.done.wait(PROFILE_INTERVAL / 1000):
+            self._sample()
+        # файл пишем здесь же, в потоке профилировщика, а не в event loop
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(PROFILE_DIR / self.name, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        profiler_stats["samples"] += sum(self.stacks.values())
+
+
+def start(scope: Scope) -> Optional[Session]:
+    """Запускает сессию, если профилирование включено и запрос её просит"""
+    global _active
+    if not PROFILING or (HEADER, b"1") not in scope.get("headers", ()):
+        return None
+    if _active is not None:
+        profiler_stats["skipped_busy"] += 1
+        return None
+    _active = Session(scope)
+    _active.thread.start()
+    profiler_stats["sessions"] += 1
+    return _active
+
+
+def stop(session: Session):
+    global _active
+    session.done.set() # не join - поток сам допишет файл и завершится
+    if _active is session:
+        _active = None
@@ -10,6 +10,10 @@ import re
 from typing import List, Tuple
 import random
 
+from backend.tools.log import get_logger
+
+log = get_logger("imgs")
+
 BASE_PATH = "../media/defaults"
 
 PHOTO_PATTERN = re.compile(r"^p(\d*)\.[a-zA-Z0-9]+$", re.IGNORECASE)
@@ -34,7 +38,7 @@ def _scan_files() -> Tuple[List[str], List[str], List[str], List[str]]:
     (photos, banners, danger_photos, danger_banners)
     """
     full_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../..", BASE_PATH.lstrip("/")))
-    print(full_path)
+    log.debug("defaults_dir", path=full_path)
     
     if not os.path.exists(full_path):
         raise FileNotFoundError(f"[imgs.py] Папка не найдена: {full_path}")
@@ -61,8 +65,8 @@ def _scan_files() -> Tuple[List[str], List[str], List[str], List[str]]:
         else:
             pass
 
-    print(f"[imgs.py] Загружено: {len(photos)} фото, {len(banners)} баннеров, "
-          f"{len(danger_photos)} pd, {len(danger_banners)} bd")
+    log.info("defaults_loaded", photos=len(photos), banners=len(banners),
+             danger_photos=len(danger_photos), danger_banners=len(danger_banners))
 
     return photos, banners, danger_photos, danger_banners
 
@@ -83,11 +87,12 @@ def get_random_photos() -> str:
         return BASE_PATH + "/p1.png"
 
     choice = random.choice(total_photos)
+    danger = choice in _pd # сравниваем до превращения пути в URL
     choice = choice.replace("\\", "/")
     choice = choice.replace("..", "/api")
     
-    if choice in _pd:
-        print(f"[imgs.py] ☢️ DANGER PHOTO ACTIVATED: {choice}")
+    if danger:
+        log.info("danger_photo", url=choice) # ☢️
     
     return choice
 
@@ -102,10 +107,20 @@ def get_random_banners() -> str:
         return BASE_PATH + "/b1.png"
 
     choice = random.choice(total_banners)
+    danger = choice in _bd
     choice = choice.replace("\\", "/")
     choice = choice.replace("..", "/api")
     
-    if choice in _bd:
-        print(f"[imgs.py] ☢️ DANGER BANNER ACTIVATED: {choice}")
+    if danger:
+        log.info("danger_banner", url=choice) # ☢️
+
+    return choice
 
-    return choice
\ No newline at end of file
+
+def get_all_defaults() -> Tuple[List[str], List[str]]:
+    """
+    Все стандартные картинки в виде URL: (фото, баннеры).
+    Нужно, чтобы заранее подготовить для них уменьшенные копии.
+    """
+    to_url = lambda path: path.replace("\\", "/").replace("..", "/api")
+    return [to_url(p) for p in _photos + _pd], [to_url(b) for b in _banners + _bd]
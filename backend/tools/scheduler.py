@@ -0,0 +1,156 @@
+"""
+<| scheduler.py |>
+Описание:
+простой планировщик фоновых задач внутри event loop.
+Каждая задача крутится в своём asyncio.Task с заданным интервалом.
+При нескольких воркерах общие задачи (БД, media) выполняет только один -
+тот, кто держит файловую блокировку; задачи `everywhere` (прогрев своих
+кэшей) работают в каждом воркере.
+Made with ❤️ by @snowlover4ever
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError: # Windows - там и воркер один (режим разработки)
+    fcntl = None
+
+from backend.tools.log import get_logger
+
+LEADER_RETRY = 30 # сек - как часто не-лидер пробует перехватить блокировку
+
+log = get_logger("scheduler")
+
+
+class Job:
+    """Задача планировщика + её статистика"""
+
+    def __init__(self, name: str, every: float, fn: Callable[[], Awaitable[Any]], run_at_start: bool, everywhere: bool):
+        self.name = name
+        self.every = every
+        self.fn = fn
+        self.run_at_start = run_at_start
+        self.everywhere = everywhere
+
+        self.runs = 0
+        self.failures = 0
+        self.total_time = 0.0
+        self.last_run: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_result: Any = None
+        self.last_error: Optional[str] = None
+
+    async def run(self) -> Any:
+        start = perf_counter()
+        self.last_run = datetime.now()
+        try:
+            self.last_result = await self.fn()
+            self.last_error = None
+            return self.last_result
+        except Exception as e:
+            self.failures += 1
+            self.last_error = repr(e)
+            log.error("job_failed", job=self.name, exc_info=e)
+        finally:
+            self.runs += 1
+            self.last_duration = perf_counter() - start
+            self.total_time += self.last_duration
+
+    def stats(self) -> dict:
+        return {
+            "every": self.every,
+            "everywhere": self.everywhere,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_ms": round(self.last_duration * 1000, 2) if self.last_duration is not None else None,
+            "avg_ms": round(self.total_time / self.runs * 1000, 2) if self.runs else None,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """
+    ⏰ Периодические задачи \n
+    `every <= 0` - задача зарегистрирована, но сама не запускается (только `run`). \n
+    `everywhere` - задача нужна каждому воркеру, а не только лидеру.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self.leader = False
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._lock_fd: Optional[int] = None
+
+    def add(self, name: str, every: float, fn: Callable[[], Awaitable[Any]],
+            run_at_start: bool = False, everywhere: bool = False):
+        self.jobs[name] = Job(name, every, fn, run_at_start, everywhere)
+
+    async def _loop(self, job: Job):
+        if not job.run_at_start:
+            await asyncio.sleep(job.every)
+        while True:
+            await job.run()
+            await asyncio.sleep(job.every)
+
+    def _start_jobs(self):
+        for name, job in self.jobs.items():
+            if job.every > 0 and name not in self._tasks and (self.leader or job.everywhere):
+                self._tasks[name] = asyncio.create_task(self._loop(job), name=f"job:{name}")
+
+    def _try_lock(self, lock_path: Path) -> bool:
+        if fcntl is None:
+            return True
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB) # снимается сама, если процесс умер
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _lead(self, lock_path: Path):
+        """Ждёт, пока освободится блокировка (например, умер прежний лидер)"""
+        while not self._try_lock(lock_path):
+            await asyncio.sleep(LEADER_RETRY)
+        self.leader = True
+        self._start_jobs()
+
+    def start(self, lock_path: Optional[Path] = None):
+        """
+        Без `lock_path` - этот процесс сразу лидер. \n
+        С `lock_path` - лидером становится тот воркер, кто первым возьмёт блокировку файла.
+        """
+        if lock_path is None:
+            self.leader = True
+        elif not self.leader and "leader" not in self._tasks:
+            self._tasks["leader"] = asyncio.create_task(self._lead(lock_path), name="job:leader")
+        self._start_jobs()
+
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd) # отдаём лидерство
+            self._lock_fd = None
+        self.leader = False
+
+    async def run(self, name: str) -> Any:
+        """Запустить задачу вне расписания"""
+        return await self.jobs[name].run()
+
+    def stats(self) -> dict:
+        return {"leader": self.leader, "pid": os.getpid(), "jobs": {name: job.stats() for name, job in self.jobs.items()}}
+
+
+scheduler = Scheduler()
@@ -1,82 +1,226 @@
 from backend.models.database import (get_db, AsyncSession)
 from backend.models import (User, Linked, Favorites, Reputation, Comment)
 from backend.tools.user.user import (get_user, check_role, try_get_user, give_token, get_user_by_ID)
+from backend.tools.cache import TTLCache
+from backend.tools.media.storage import (ingest_upload, is_stored)
+from backend.tools.media.variants import (variant_urls, thumb_url, load_variants, schedule_variants)
+from backend.tools.log import get_logger
 from fastapi import (APIRouter, Request, Response, Form, Depends, Query, UploadFile, File)
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm.attributes import flag_modified
 from sqlalchemy import (select, func)
 from datetime import datetime
 from pathlib import Path
-import shutil
+import json
 
-async def get_user_dict(user: User.User, is_owner: bool, db: AsyncSession = None, full: bool = True):
-    if not user: 
-        return None
+# Кэш собранных профилей: user_id -> _Profile (без полей, зависящих от зрителя).
+# Кэш живёт в воркере, поэтому TTL небольшой - чужие воркеры его не сбрасывают.
+PROFILE_CACHE_TTL = 60 # сек
+PROFILE_CACHE_SIZE = 1024
+PROFILE_COMMENTS = 100
+profile_cache = TTLCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
+_generation = 0 # растёт при каждой записи, чтобы не закэшировать профиль, собранный до неё
+log = get_logger("profile")
+
+
+class _Profile:
+    """Собранный профиль + готовый JSON + id авторов комментариев (для инвалидации)"""
+    __slots__ = ("data", "json", "senders")
 
-    base = {
+    def __init__(self, data: dict):
+        self.data = data
+        self.senders = {com["sender"]["id"] for com in data["comments"] if com["sender"]}
+        self.json = _dumps(data)
+
+
+def _dumps(data) -> bytes:
+    # так же, как это делает JSONResponse
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _short_dict(user: User.User) -> dict:
+    return {
         "id": user.id,
         "username": user.username,
         "nickname": user.nickname,
         "photo": user.photo,
+        "photo_thumb": thumb_url(user.photo),
     }
-    
-    if not full:
-        return base
 
-    
-    linked = await db.execute(
-        select(Linked.LinkedTrainModel).filter(Linked.LinkedTrainModel.user_id == user.id)
-    )
-    linked = linked.scalar_one_or_none()
 
-    favorites = await db.execute(
-        select(Favorites.FavoritesModel).filter(Favorites.FavoritesModel.user_id == user.id)
-    )
-    favorites = favorites.scalar_one_or_none()
+def _comment_dict(com: Comment.CommentModel, sender: User.User | None) -> dict:
+    return {
+        "id": com.id,
+        "body": com.body,
+        "timestamp": com.date.isoformat(),
+        "sender": _short_dict(sender) if sender else None
+    }
+
+
+def _reputation_dict(rep: Reputation.ReputationModel | None) -> dict | None:
+    if not rep:
+        return None
+    return {"id": rep.id, "user_id": rep.user_id, "likes": rep.likes, "dislikes": rep.dislikes}
 
+
+async def _get_profile(user: User.User, db: AsyncSession) -> _Profile:
+    """Профиль из кэша, либо собираем заново (3 запроса вместо 4 + N)"""
+    if (profile := profile_cache.get(user.id)) is not None:
+        return profile
+
+    generation = _generation
     reputation = await db.execute(
         select(Reputation.ReputationModel).filter(Reputation.ReputationModel.user_id == user.id)
     )
     reputation = reputation.scalar_one_or_none()
 
+    # комментарии сразу вместе с авторами
     comments = await db.execute(
-        select(Comment.CommentModel).filter(Comment.CommentModel.target_id == user.id).order_by(Comment.CommentModel.date.desc()).limit(100)
+        select(Comment.CommentModel, User.User)
+        .outerjoin(User.User, User.User.id == Comment.CommentModel.sender_id)
+        .filter(Comment.CommentModel.target_id == user.id)
+        .order_by(Comment.CommentModel.date.desc())
+        .limit(PROFILE_COMMENTS)
     )
-    comments = comments.scalars().all()
-
-    formatted_comments = []
-    for com in comments:
-        sender_user = await get_user_by_ID(com.sender_id, db)
-        sender_dict = await get_user_dict(sender_user, False, db, False)
-        
-        formatted_comments.append({
-            "id": com.id,
-            "body": com.body,
-            "timestamp": com.date.isoformat(),
-            "sender": sender_dict
-        })
+    comments = comments.all()
+    await load_variants([
+        (user.photo, "photos"), (user.banner, "profileb"),
+        *((sender.photo, "photos") for _, sender in comments if sender),
+    ])
 
-    return {
-        **base,
+    profile = _Profile({
+        **_short_dict(user),
         "description": user.description,
         "banner": user.banner,
+        "photo_variants": variant_urls(user.photo, "photos"),
+        "banner_variants": variant_urls(user.banner, "profileb"),
         "rank": user.rank,
         "role": user.role,
-        "achievements": user.achievements,
-        
+        "achievements": dict(user.achievements or {}),
+
         "date_created": user.date_created.strftime("%d-%m-%Y") if user.date_created else None,
 
-        "linked": linked if is_owner and linked else None,
-        "favorites": favorites if is_owner and favorites else None,
-        "reputation": reputation,
-        
-        "comments": formatted_comments
+        "reputation": _reputation_dict(reputation),
+
+        "comments": [_comment_dict(com, sender) for com, sender in comments]
+    })
+    if generation == _generation:
+        profile_cache.set(user.id, profile)
+    return profile
+
+
+async def _owner_fields(user: User.User, is_owner: bool, db: AsyncSession) -> dict:
+    """Поля, которые видит только владелец профиля"""
+    if not is_owner:
+        return {"linked": None, "favorites": None}
+
+    linked = await db.execute(
+        select(Linked.LinkedTrainModel).filter(Linked.LinkedTrainModel.user_id == user.id)
+    )
+    linked = linked.scalar_one_or_none()
+
+    favorites = await db.execute(
+        select(Favorites.FavoritesModel).filter(Favorites.FavoritesModel.user_id == user.id)
+    )
+    favorites = favorites.scalar_one_or_none()
+
+    return {
+        "linked": jsonable_encoder(linked) if linked else None,
+        "favorites": jsonable_encoder(favorites) if favorites else None,
     }
 
-def save_file(file: UploadFile, folder: str, current_url: str | None, username: str) -> str | None:
-    if not file or not file.filename:
+
+async def get_user_dict(user: User.User, is_owner: bool, db: AsyncSession = None, full: bool = True):
+    if not user: 
+        return None
+
+    if not full:
+        await load_variants([(user.photo, "photos")])
+        return _short_dict(user)
+
+    profile = await _get_profile(user, db)
+    return {**profile.data, **await _owner_fields(user, is_owner, db)}
+
+
+async def get_short_dicts(users: list[User.User | None]) -> list[dict | None]:
+    """
+    👥 Короткие dict для пачки пользователей (авторы сообщений и т.п.) \n
+    Варианты аватарок подтягиваются одним `load_variants` на всех, а не по одному.
+    """
+    await load_variants([(user.photo, "photos") for user in users if user])
+    return [_short_dict(user) if user else None for user in users]
+
+
+async def get_user_json(user: User.User, is_owner: bool, db: AsyncSession) -> bytes:
+    """
+    ⚡ То же, что `get_user_dict`, но сразу готовый JSON \n
+    Общая часть берётся из кэша, поля владельца дописываются в конец.
+    """
+    if not user:
+        return b"null"
+
+    profile = await _get_profile(user, db)
+    return profile.json[:-1] + b"," + _dumps(await _owner_fields(user, is_owner, db))[1:]
+
+
+async def warm_profiles(db: AsyncSession, limit: int = 50) -> int:
+    """🔥 Заранее собирает профили, которые комментируют чаще всего"""
+    top = await db.execute(
+        select(User.User)
+        .join(Comment.CommentModel, Comment.CommentModel.target_id == User.User.id)
+        .group_by(User.User.id)
+        .order_by(func.count(Comment.CommentModel.id).desc())
+        .limit(limit)
+    )
+    users = top.scalars().all()
+    for user in users:
+        await _get_profile(user, db)
+    return len(users)
+
+
+def profile_changed(user_id: int):
+    """
+    🧹 Сбрасывает профиль пользователя и профили, где он оставлял комментарии \n
+    Вызывать после изменения ника / фото / описания / роли.
+    """
+    global _generation
+    _generation += 1
+    profile_cache.pop(user_id)
+    profile_cache.drop_where(lambda _, profile: user_id in profile.senders)
+
+
+def profile_comment_added(target_id: int, comment: Comment.CommentModel, sender: User.User):
+    """✏️ Дописывает новый комментарий в закэшированный профиль"""
+    global _generation
+    _generation += 1
+    if (profile := profile_cache.pop(target_id)) is None:
+        return
+
+    comments = [_comment_dict(comment, sender), *profile.data["comments"]][:PROFILE_COMMENTS]
+    profile_cache.set(target_id, _Profile({**profile.data, "comments": comments}))
+
+
+def profile_reputation_changed(target_id: int, reputation: Reputation.ReputationModel):
+    """✏️ Обновляет репутацию в закэшированном профиле"""
+    global _generation
+    _generation += 1
+    if (profile := profile_cache.pop(target_id)) is None:
+        return
+
+    profile_cache.set(target_id, _Profile({**profile.data, "reputation": _reputation_dict(reputation)}))
+
+async def save_file(file: UploadFile, folder: str, current_url: str | None) -> str | None:
+    """
+    💾 Сохраняет фото / баннер через `ingest_upload` \n
+    Бросает `UploadRejected` / `PoolBusy`.
+    """
+    if not (url := await ingest_upload(file, folder)):
         return None
-    
-    if current_url:
+    schedule_variants(url, folder)
+
+    # старые файлы вида {username}_{folder}_{timestamp} принадлежат только этому пользователю,
+    # файлы из хранилища могут быть общими - их убирает сборщик мусора
+    if current_url and current_url != url and not is_stored(current_url):
         clean_path = current_url.replace("/api/", "").lstrip("/")
         old_path = Path(clean_path)
         
@@ -85,18 +229,6 @@ def save_file(file: UploadFile, folder: str, current_url: str | None, username:
                 if not "defaults" in str(old_path):
                     old_path.unlink()
             except OSError as e:
-                print(f"Error deleting file {old_path}: {e}")
-
-    save_dir = Path(f"media/{folder}")
-    save_dir.mkdir(parents=True, exist_ok=True)
-    
-    timestamp = datetime.now().timestamp()
-    extension = Path(file.filename).suffix
-    fname = f"{username}_{folder}_{timestamp}{extension}"
-    dest = save_dir / fname
-    
-    with dest.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    dest_str = str(dest).replace('\\', '/')
-    return f"/api/{dest_str}"
\ No newline at end of file
+                log.warning("old_file_delete_failed", path=str(old_path), error=repr(e))
+
+    return url
@@ -2,10 +2,13 @@ from fastapi import (Depends, Request, Response)
 from backend.models.database import (get_db, AsyncSession)
 from backend.models.User import User
 from backend.tools.constant import *
+from backend.tools.cache import TTLCache
+from backend.tools.pool import BoundedPool
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
-from sqlalchemy import select
+from sqlalchemy import (select, inspect)
+from sqlalchemy.orm import make_transient_to_detached
 from typing import Literal
 from dotenv import load_dotenv
 import os
@@ -13,11 +16,25 @@ load_dotenv()
 
 roles = Literal["USER", "JMODER", "SMODER", "ADMIN", "SADMIN", "OWNER"]
 
+# Кэш проверенных токенов: token -> (снимок User, exp)
+USER_CACHE_TTL = 30 # сек
+USER_CACHE_SIZE = 4096
+TOKEN_REFRESH_AFTER = 0.5 # перевыпускаем токен, когда прошла половина его жизни
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# bcrypt отпускает GIL, поэтому хватает потоков. Каждый хэш ~100-300мс CPU,
+# так что воркеров не больше ядер, а лишние логины сразу получают отказ.
+HASH_WORKERS = min(4, os.cpu_count() or 1)
+HASH_QUEUE_LIMIT = 32
+hash_pool = BoundedPool("bcrypt", HASH_WORKERS, HASH_QUEUE_LIMIT)
+
 crypt = CryptContext(schemes=["bcrypt"])
-def hash_pw(password: str) -> str:
-    return crypt.hash(password)
-def verify_pw(password: str, hash: str) -> bool:
-    return crypt.verify(password, hash=hash) 
+async def hash_pw(password: str) -> str:
+    """🔐 Хэширует пароль в пуле `hash_pool` (может бросить `PoolBusy`)"""
+    return await hash_pool.run(crypt.hash, password)
+async def verify_pw(password: str, hash: str) -> bool:
+    """🔐 Проверяет пароль в пуле `hash_pool` (может бросить `PoolBusy`)"""
+    return await hash_pool.run(crypt.verify, password, hash)
 
 async def get_user(username: str, db: AsyncSession = Depends(get_db)) -> User:
     """
@@ -44,20 +61,66 @@ async def get_user_by_ID(id: int, db: AsyncSession = Depends(get_db)) -> User:
 async def try_get_user(req: Request, db: AsyncSession = Depends(get_db)):
     """
     ⚙️ Пытается получить пользователя из `Request` \n
+    В рамках одного запроса пользователь ищется не больше одного раза. \n
     return User | None
     """
+    if hasattr(req.state, "viewer"):
+        return req.state.viewer # уже искали в этом запросе
+
+    req.state.viewer = await _resolve_user(req, db)
+    return req.state.viewer
+
+async def _resolve_user(req: Request, db: AsyncSession) -> User | None:
     token = req.cookies.get(COOKIE_NAME)
     if not token:
         return None # нету токена = err 401
-    
+
+    if (cached := user_cache.get(token)) is not None:
+        snapshot, req.state.token_exp = cached
+        return await db.merge(snapshot, load=False) # без SELECT
+
     try:
         payload = jwt.decode(token, os.environ.get("key"))
-        username = payload.get('sub')
-
-        user = await get_user(username, db)
-        return user # User | None - есть ли пользователь за токеном? (всё окей, в основном)
     except JWTError:
         return None # неверный токен
+
+    user = await get_user(payload.get('sub'), db)
+    if user: # User | None - есть ли пользователь за токеном? (всё окей, в основном)
+        exp = payload.get('exp')
+        req.state.token_exp = exp
+        user_cache.set(token, (_snapshot(user), exp), exp - datetime.now().timestamp() if exp else None)
+    return user
+
+def _snapshot(user: User) -> User:
+    """Отвязанная от сессии копия пользователя, которую можно `merge` в любую сессию."""
+    snapshot = User(**{
+        attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs
+    })
+    snapshot.achievements = dict(user.achievements or {})
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+def invalidate_user(username: str):
+    """
+    🧹 Сбрасывает кэш токенов пользователя \n
+    Вызывать после любого изменения пользователя (профиль, роль, вход).
+    """
+    user_cache.drop_where(lambda _, value: value[0].username == username)
+
+def forget_token(token: str | None):
+    """🧹 Убирает токен из кэша (logout)"""
+    if token:
+        user_cache.pop(token)
+
+def token_needs_refresh(req: Request) -> bool:
+    """
+    ⏳ Нужно ли перевыпустить токен из текущего запроса \n
+    return bool
+    """
+    exp = getattr(req.state, "token_exp", None)
+    if not exp:
+        return True
+    return exp - datetime.now().timestamp() < TOKEN_LIFE * 60 * TOKEN_REFRESH_AFTER
     
 def give_token(resp: Response, user: User):
     """
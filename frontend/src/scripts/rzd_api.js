@@ -1,16 +1,33 @@
 // @/scripts/rzd_api.js
-import { ref } from 'vue'
+import { ref, onScopeDispose } from 'vue'
 
 const API_BASE = '/api'
 
+// Отмена устаревшего запроса: бэкенд видит обрыв соединения и отменяет запросы к RZD,
+// которые были нужны только ему
+function useAbortable() {
+  let controller = null
+  const abort = () => controller?.abort()
+  const next = () => {
+    abort()
+    controller = new AbortController()
+    return controller.signal
+  }
+  onScopeDispose(abort) // ушли со страницы
+  return { next, abort }
+}
+
+const isAbort = (e) => e?.name === 'AbortError'
+
 // Прямой поиск станций
-export async function findStation(query) {
+export async function findStation(query, signal) {
   if (!query || query.length < 2) return []
   try {
-    const res = await fetch(`${API_BASE}/stations?part=${encodeURIComponent(query)}`)
+    const res = await fetch(`${API_BASE}/stations?part=${encodeURIComponent(query)}`, { signal })
     const data = await res.json()
     return data.stations || []
   } catch (e) {
+    if (isAbort(e)) throw e
     console.error('Station resolve error:', e)
     return []
   }
@@ -21,14 +38,18 @@ export function useStationSearch() {
   const suggestions = ref([])
   const isLoading = ref(false)
   let debounceTimer = null
+  const request = useAbortable()
 
   const search = async (query) => {
     clearTimeout(debounceTimer)
     debounceTimer = setTimeout(async () => {
       isLoading.value = true
-      const results = await findStation(query)
-      suggestions.value = results
-      isLoading.value = false
+      try {
+        suggestions.value = await findStation(query, request.next()) // предыдущая буква больше не нужна
+        isLoading.value = false
+      } catch (e) {
+        if (!isAbort(e)) throw e
+      }
     }, 1)
   }
 
@@ -36,32 +57,49 @@ export function useStationSearch() {
 }
 
 // Хук для получения маршрутов
+// Сервер отвечает не дольше routes_budget; маршруты, которые не успел найти,
+// помечены incomplete и дозапрашиваются тихо, без индикатора загрузки
+const INCOMPLETE_RETRY_MS = 2000
+const INCOMPLETE_RETRIES = 3
+
 export function useRoutes() {
   const routes = ref([])
   const info = ref({})
   const isLoading = ref(false)
   const error = ref(null)
+  const request = useAbortable()
+  let retryTimer = null
+  onScopeDispose(() => clearTimeout(retryTimer))
 
-  const fetchRoutes = async (codeFrom, codeTo) => {
+  const fetchRoutes = async (codeFrom, codeTo, retriesLeft = INCOMPLETE_RETRIES) => {
     if (!codeFrom || !codeTo) return
 
-    isLoading.value = true
+    clearTimeout(retryTimer)
+    const silent = retriesLeft < INCOMPLETE_RETRIES
+    const signal = request.next() // новый поиск отменяет предыдущий
+    if (!silent) isLoading.value = true
     error.value = null
 
     try {
       const res = await fetch(
-        `${API_BASE}/routes?code_from=${codeFrom}&code_to=${codeTo}`
+        `${API_BASE}/routes?code_from=${codeFrom}&code_to=${codeTo}`,
+        { signal }
       )
       const data = await res.json()
       
       routes.value = data.trains || []
       info.value = data.info || {}
+      if (data.incomplete && retriesLeft > 0) {
+        retryTimer = setTimeout(() => fetchRoutes(codeFrom, codeTo, retriesLeft - 1), INCOMPLETE_RETRY_MS)
+      }
     } catch (e) {
+      if (isAbort(e)) return // загрузку закончит (или уже закончил) следующий запрос
+      if (silent) return // на экране уже есть список с fallback-маршрутами
       console.error('Routes fetch error:', e)
       error.value = e.message
       routes.value = []
     } finally {
-      isLoading.value = false
+      if (!signal.aborted && !silent) isLoading.value = false
     }
   }
 
@@ -3,12 +3,17 @@ import { useRoute, useRouter } from 'vue-router'
 import { useAuth } from '@/scripts/useAuth'
 import { api, relTime } from '@/scripts/helpers'
 
+// уменьшенные копии картинки: { "320": { webp: url, avif: url }, ... }
+export type Variants = Record<string, Record<string, string>>
+
 export interface User {
   username: string
   nickname: string
   description?: string
   photo?: string
   banner?: string
+  photo_variants?: Variants
+  banner_variants?: Variants
   role?: string
   date_created?: string
   is_owner?: boolean
@@ -31,6 +36,7 @@ export interface Comment {
     username: string
     nickname: string
     photo?: string
+    photo_thumb?: string
   }
 }
 
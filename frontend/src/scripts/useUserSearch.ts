@@ -5,6 +5,7 @@ export interface UserMention {
   username: string
   nickname: string
   photo: string
+  photo_thumb?: string
 }
 
 export function useUserSearch() {
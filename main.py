@@ -1,26 +1,86 @@
 """
 Made with ❤️ by @snowlover4ever
+
+Запуск:
+    python main.py              - разработка: один процесс + reload
+    mode=prod python main.py    - прод: `workers` воркеров, uvloop/httptools (если стоят), без reload
 """
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from backend.api.rzd_api import rzd_api
+from backend.api.rzd_api import rzd_api, stop_background, client as rzd_client
+import asyncio
+import os
 import uvicorn
+from importlib.util import find_spec
 from backend.models.database import init_db, engine
-from backend.models import (User, Comment, Favorites, Linked, Report, Reputation)
-from backend.routes import (auth, profile)
+from backend.models import (User, Comment, Favorites, Linked, Report, Reputation, Chat, Delay)
+from backend.routes import (auth, profile, stats, chat, delays)
+from backend.tools.constant import (PRODUCTION, HOST, PORT, WORKERS, KEEP_ALIVE, BACKLOG, GRACEFUL_TIMEOUT,
+                                    LIMIT_CONCURRENCY, SCHEDULER_LOCK, DB_READY)
+from backend.tools.user.user import hash_pool
+from backend.tools.scheduler import scheduler
+from backend.tools.maintenance import register_jobs
+from backend.tools.media.serving import MediaFiles
+from backend.tools.metrics import RequestMetricsMiddleware
+from backend.tools.chat.broker import (start_bus, stop_bus)
+from backend.tools.chat.writer import history_writer
+from backend.tools.delays import delay_recorder
+from backend.tools.log import stop_logging
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
+    if not DB_READY: # в проде схему уже создал главный процесс
+        await init_db()
+    register_jobs()
+    scheduler.start(SCHEDULER_LOCK) # общие задачи - только у одного воркера
+    history_writer.start()
+    await start_bus()
     yield
+    # сюда попадаем, когда uvicorn уже дообслужил открытые запросы (timeout_graceful_shutdown)
+    await stop_bus()
+    await history_writer.stop()
+    await scheduler.stop()
+    await stop_background() # иначе поиски маршрутов пойдут в уже закрытый клиент
+    await rzd_client.aclose()
+    await delay_recorder.flush() # после закрытия клиента новых наблюдений уже не будет
+    hash_pool.shutdown()
     await engine.dispose()
+    stop_logging() # дописываем очередь логов
 
 app = FastAPI(openapi_url="/debug", lifespan=lifespan)
+app.add_middleware(RequestMetricsMiddleware)
 app.include_router(rzd_api)
 app.include_router(auth.app)
 app.include_router(profile.app)
-app.mount("/media", StaticFiles(directory="media"), name="media") 
+app.include_router(stats.app)
+app.include_router(chat.app)
+app.include_router(delays.app)
+app.mount("/media", MediaFiles(directory="media"), name="media")
+
+
+async def _prepare_db():
+    await init_db()
+    await engine.dispose() # соединения главного процесса воркерам не нужны
+
+
+def run_production():
+    asyncio.run(_prepare_db()) # один раз, а не в каждом воркере наперегонки
+    os.environ["db_ready"] = "1" # воркеры наследуют окружение
+    uvicorn.run(
+        "main:app", host=HOST, port=PORT,
+        workers=WORKERS,
+        loop="uvloop" if find_spec("uvloop") else "auto",
+        http="httptools" if find_spec("httptools") else "auto",
+        timeout_keep_alive=KEEP_ALIVE,
+        backlog=BACKLOG,
+        limit_concurrency=LIMIT_CONCURRENCY,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        access_log=False, # время запросов и так пишет RequestMetricsMiddleware
+    )
+
 
 if __name__ == '__main__':
-    uvicorn.run("main:app", host='0.0.0.0', port=8000, reload=True)
\ No newline at end of file
+    if PRODUCTION:
+        run_production()
+    else:
+        uvicorn.run("main:app", host=HOST, port=PORT, reload=True)
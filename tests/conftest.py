@@ -0,0 +1,23 @@
+"""
+<| conftest.py |>
+Описание:
+окружение для тестов: обязательные переменные из .env и отдельная
+временная БД, чтобы тесты никогда не трогали ./database.db.
+Made with ❤️ by @snowlover4ever
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("key", "test-secret")
+os.environ.setdefault("token_live", "60")
+os.environ.setdefault("cookie_name", "tok")
+os.environ["bench_db"] = os.path.join(tempfile.mkdtemp(prefix="loltrains-tests-"), "test.db")
+
+# все модели сразу, как в main.py: связи между ними разрешаются по имени
+from backend.models import (User, Comment, Favorites, Linked, Report, Reputation, Chat, Delay) # noqa: E402,F401
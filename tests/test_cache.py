@@ -0,0 +1,67 @@
+import pytest
+
+from backend.tools import cache as cache_module
+from backend.tools.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(maxsize=10, ttl=30)
+    cache.set("a", 1)
+    clock[0] += 29
+    assert cache.get("a") == 1
+    clock[0] += 1
+    assert cache.get("a") is None
+    assert len(cache) == 0 # просроченная запись удалена при чтении
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_per_entry_ttl_can_only_be_shorter(clock):
+    cache = TTLCache(maxsize=10, ttl=30)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2, ttl=100) # дольше ttl кэша не живёт
+    clock[0] += 6
+    assert cache.get("short", "miss") == "miss"
+    assert cache.get("long") == 2
+    clock[0] += 24
+    assert cache.get("long") is None
+
+
+def test_lru_eviction_respects_reads(clock):
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a") # теперь самая старая - b
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_pop_drop_where_and_items(clock):
+    cache = TTLCache(maxsize=10, ttl=30)
+    for i in range(5):
+        cache.set(i, i * 10, ttl=10 if i == 4 else None)
+    assert cache.pop(0) == 0 and cache.pop(0, "gone") == "gone"
+    assert cache.drop_where(lambda key, value: value >= 30) == 2
+    cache.set(5, 50, ttl=1)
+    clock[0] += 2
+    assert dict(cache.items()) == {1: 10, 2: 20} # просроченные не отдаются
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_stats():
+    cache = TTLCache(maxsize=4, ttl=30)
+    assert cache.stats()["hit_rate"] is None
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    assert cache.stats() == {"size": 1, "maxsize": 4, "hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5}
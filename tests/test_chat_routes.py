@@ -0,0 +1,117 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import select
+from starlette.websockets import WebSocketDisconnect
+
+from backend.models.database import (async_session_maker, engine, init_db)
+from backend.models.Chat import ChatRoomModel
+from backend.models.User import User
+from backend.routes import chat
+from backend.tools.chat.writer import (history_writer, next_message_id)
+from backend.tools.constant import (COOKIE_NAME, SECRET_KEY)
+from backend.tools.user import profile
+
+
+@pytest.fixture(scope="module")
+def client():
+    asyncio.run(init_db())
+    app = FastAPI()
+    app.include_router(chat.app)
+    with TestClient(app) as c:
+        yield c
+    asyncio.run(engine.dispose())
+
+
+async def _make_user(username: str) -> int:
+    async with async_session_maker() as db:
+        user = User(username=username, nickname=username.upper(), description="", password="-",
+                    photo="/api/media/defaults/a.png", banner="", role="USER", ip_address="127.0.0.1")
+        db.add(user)
+        await db.commit()
+        return user.id
+
+
+def _sign_in(client: TestClient, username: str):
+    token = jwt.encode({"sub": username, "exp": datetime.now().timestamp() + 600}, SECRET_KEY)
+    client.cookies.set(COOKIE_NAME, token)
+
+
+async def _rooms(name: str) -> list:
+    async with async_session_maker() as db:
+        return (await db.execute(select(ChatRoomModel).filter_by(name=name))).scalars().all()
+
+
+def test_anonymous_socket_does_not_create_rooms(client):
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect("/chat/ws?room=spam-room-1") as ws:
+            ws.receive_text()
+    assert closed.value.code == 1008
+    assert asyncio.run(_rooms("spam-room-1")) == []
+
+
+def test_binary_frame_is_an_error_not_a_crash(client):
+    async def make_room():
+        async with async_session_maker() as db:
+            db.add(ChatRoomModel(name="open-room", date_created=datetime.now()))
+            await db.commit()
+    asyncio.run(make_room())
+
+    with client.websocket_connect("/chat/ws?room=open-room") as ws:
+        ws.send_bytes(b"\x00\x01")
+        assert json.loads(ws.receive_text()) == {"type": "error", "status": "ERR"}
+        ws.send_text(json.dumps({"type": "message", "body": "hi"}))
+        assert json.loads(ws.receive_text()) == {"type": "error", "status": "NA"} # сокет жив
+
+
+def test_message_room_sees_pending_and_written_rows():
+    async def scenario():
+        await init_db()
+        pending = {"id": next_message_id(), "room_id": 7, "sender_id": 1, "body": "x",
+                   "attachment": None, "deleted": False, "date": datetime.now()}
+        history_writer.add(pending)
+        before = await chat._message_room(pending["id"])
+        await history_writer.flush()
+        after = await chat._message_room(pending["id"])
+        missing = await chat._message_room(next_message_id())
+        await engine.dispose()
+        return before, after, missing
+
+    assert asyncio.run(scenario()) == (7, 7, None)
+
+
+def test_signed_in_message_is_delivered_and_in_history(client, monkeypatch):
+    user_id = asyncio.run(_make_user("writer1"))
+    _sign_in(client, "writer1")
+    try:
+        with client.websocket_connect("/chat/ws?room=talk-room") as ws:
+            ws.send_text(json.dumps({"type": "message", "body": "hi"}))
+            sent = json.loads(ws.receive_text())
+    finally:
+        client.cookies.clear()
+
+    assert sent["body"] == "hi" and sent["room"] == "talk-room"
+    assert sent["sender"]["id"] == user_id and sent["sender"]["username"] == "writer1"
+
+    # строка ещё в буфере писателя - история всё равно её отдаёт, с автором
+    assert history_writer.pending_row(int(sent["id"])) is not None
+    assert client.get("/chat/history?room=talk-room").json() == [sent]
+
+    async def flush():
+        await history_writer.flush()
+        await engine.dispose()
+    asyncio.run(flush())
+    assert history_writer.pending_row(int(sent["id"])) is None
+
+    loads = []
+
+    async def load_variants(items):
+        loads.append(list(items))
+    monkeypatch.setattr(profile, "load_variants", load_variants)
+    assert client.get("/chat/history?room=talk-room").json() == [sent] # а теперь из БД
+    assert loads == [[("/api/media/defaults/a.png", "photos")]] # один заход на всю страницу
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from backend.models.database import (async_session_maker, engine, init_db)
+from backend.models.Chat import ChatMessageModel
+from backend.tools.chat import writer
+from backend.tools.chat.writer import (HistoryWriter, claim_worker_id, next_message_id)
+
+ROOM = 10_000 # у каждого теста своя комната - база общая на весь прогон
+
+
+def row(room_id: int, body="привет") -> dict:
+    return {"id": next_message_id(), "room_id": room_id, "sender_id": 1, "body": body,
+            "attachment": None, "deleted": False, "date": datetime.now()}
+
+
+async def count(room_id: int) -> int:
+    async with async_session_maker() as db:
+        return await db.scalar(select(func.count()).select_from(ChatMessageModel).filter_by(room_id=room_id))
+
+
+def run(scenario):
+    async def wrapped():
+        await init_db()
+        try:
+            return await scenario()
+        finally:
+            await engine.dispose()
+    return asyncio.run(wrapped())
+
+
+def test_ids_grow_and_are_unique():
+    ids = [next_message_id() for _ in range(10_000)]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+
+
+def test_flush_writes_batch():
+    async def scenario():
+        w = HistoryWriter()
+        for _ in range(3):
+            w.add(row(ROOM + 1))
+        await w.flush()
+        return await count(ROOM + 1), w.stats()
+
+    written, stats = run(scenario)
+    assert written == 3
+    assert stats["pending"] == 0 and stats["written"] == 3
+
+
+def test_bad_row_is_dropped_after_retries():
+    async def scenario():
+        w = HistoryWriter()
+        w.add(row(ROOM + 2))
+        w.add(row(ROOM + 2, body=None)) # NOT NULL - БД не примет никогда
+        w.add(row(ROOM + 2))
+        for _ in range(writer.MAX_ATTEMPTS):
+            await w.flush()
+            assert len(w.pending) == 3 # пока пачкой - целиком возвращается в буфер
+        await w.flush() # по одной строке
+        w.add(row(ROOM + 2)) # дальше пишется как обычно
+        await w.flush()
+        return await count(ROOM + 2), w.stats()
+
+    written, stats = run(scenario)
+    assert written == 3
+    assert stats["dropped"] == 1 and stats["pending"] == 0 and stats["failures"] == 0
+
+
+def test_rows_wait_while_db_is_down_and_pending_is_capped(monkeypatch):
+    monkeypatch.setattr(writer, "MAX_PENDING", 5)
+
+    async def down(self, rows, deletes):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    async def scenario():
+        w = HistoryWriter()
+        monkeypatch.setattr(HistoryWriter, "_write", down)
+        for _ in range(4):
+            w.add(row(ROOM + 3))
+        for _ in range(writer.MAX_ATTEMPTS + 1):
+            await w.flush() # и пачкой, и по одной - строки не теряются
+        assert len(w.pending) == 4 and w.dropped == 0
+        for _ in range(3):
+            w.add(row(ROOM + 3))
+        kept = [r["id"] for r in w.pending]
+        monkeypatch.undo()
+        await w.flush()
+        return kept, await count(ROOM + 3), w.stats()
+
+    kept, written, stats = run(scenario)
+    assert len(kept) == 5 and stats["dropped"] == 2 # самые старые ушли в лог
+    assert written == 5
+
+
+def test_history_sees_rows_being_flushed():
+    # пока flush пишет пачку, строки уже не в pending - читатель под замком дождётся записи
+    async def scenario():
+        w = HistoryWriter()
+        w.add(row(ROOM + 4))
+        flushing = asyncio.create_task(w.flush())
+        await asyncio.sleep(0)
+        async with w.lock:
+            seen = await count(ROOM + 4) + len(w.pending_for(ROOM + 4))
+        await flushing
+        return seen
+
+    assert run(scenario) == 1
+
+
+def test_worker_ids_are_unique_across_processes(tmp_path):
+    code = ("import sys; from backend.tools.chat.writer import claim_worker_id; "
+            "print(claim_worker_id()); sys.stdout.flush(); sys.stdin.read()")
+    env = {**os.environ, "worker_id_dir": str(tmp_path), "log_level": "WARNING"}
+    procs = [subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                              env=env, cwd=os.path.dirname(os.path.dirname(__file__)), text=True) for _ in range(3)]
+    try:
+        ids = [int(p.stdout.readline()) for p in procs]
+    finally:
+        for p in procs:
+            p.communicate("")
+    assert sorted(ids) == [0, 1, 2]
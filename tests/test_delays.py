@@ -0,0 +1,78 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from backend.models.database import (async_session_maker, engine, init_db)
+from backend.tools.delays import (DelayRecorder, rollup_delays, train_delays)
+
+FIXTURE = Path(__file__).parent / "fixtures" / "departed.json"
+STATION = "2006004"
+
+
+def departed() -> list:
+    return json.loads(FIXTURE.read_text(encoding="utf-8"))
+
+
+def test_delay_from_actual_time_and_from_delay_field():
+    recorder = DelayRecorder()
+    recorded = [recorder.observe(t, STATION) for t in departed()]
+
+    assert recorded == [True, True, True, False]
+    assert [(row["train_number"], row["delay_min"]) for row in recorder.pending] == [("752А", 7), ("754А", 0), ("6601", 12)]
+    assert all(row["station_code"] == int(STATION) for row in recorder.pending)
+
+
+def test_same_observation_is_recorded_once():
+    recorder = DelayRecorder()
+    train = departed()[0]
+    assert recorder.observe(train, STATION)
+    assert not recorder.observe(dict(train), STATION)
+    assert len(recorder.pending) == 1
+
+
+def test_unknown_schema_is_reported():
+    recorder = DelayRecorder()
+    recorder.observe(departed()[3], STATION)
+    recorder.observe(departed()[3], STATION)
+
+    (schema,) = recorder.stats()["unknown_schema"]
+    assert "DepartureDateTime" in schema["keys"] and schema["count"] == 2
+    assert not recorder.pending
+
+
+def test_bad_records_are_skipped():
+    recorder = DelayRecorder()
+    train = departed()[0]
+    assert not recorder.observe({**train, "DepartureDateTime": "вчера"}, STATION)
+    assert not recorder.observe({**train, "DepartureDelay": 3 * 24 * 60}, STATION)
+    assert not recorder.observe(train, "не код")
+    assert not recorder.pending
+
+
+def test_recorded_delay_reaches_daily_rollup():
+    async def scenario():
+        await init_db()
+        recorder = DelayRecorder()
+        now = datetime.now().replace(second=0, microsecond=0)
+
+        def seen(scheduled: datetime, delay: int):
+            recorder.observe({**departed()[0], "DepartureDateTime": scheduled.isoformat(),
+                              "ActualDepartureDateTime": (scheduled + timedelta(minutes=delay)).isoformat()}, STATION)
+
+        seen(now - timedelta(hours=2), 3) # два разных отправления одного поезда
+        seen(now - timedelta(hours=3), 1)
+        seen(now - timedelta(hours=3), 9) # задержку уточнили - в свёртку идёт последнее наблюдение
+        assert await recorder.flush() == 3
+
+        await rollup_delays()
+        async with async_session_maker() as db:
+            result = await train_delays(db, "752А", 7)
+        await engine.dispose()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result["departures"] == 2
+    assert result["avg_delay_min"] == 6.0
+    assert result["late_share"] == 0.5
+    assert result["stations"][0]["code"] == int(STATION)
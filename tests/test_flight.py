@@ -0,0 +1,107 @@
+import asyncio
+
+from backend.tools.flight import Flight
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_calls_share_one_task():
+    async def scenario():
+        flight, calls = Flight("test"), []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        results = await asyncio.gather(*(flight.run("k", fetch) for _ in range(5)))
+        return results, calls, flight.stats()
+
+    results, calls, stats = run(scenario())
+    assert results == ["ok"] * 5
+    assert len(calls) == 1
+    assert stats["started"] == 1 and stats["joined"] == 4 and stats["running"] == 0
+
+
+def test_call_survives_while_someone_waits():
+    async def scenario():
+        flight = Flight("test")
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "ok"
+
+        leaving = asyncio.create_task(flight.run("k", fetch))
+        staying = asyncio.create_task(flight.run("k", fetch))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        return await staying, leaving, flight.stats()
+
+    result, leaving, stats = run(scenario())
+    assert result == "ok"
+    assert leaving.cancelled()
+    assert stats["kept"] == 1 and stats["cancelled"] == 0
+
+
+def test_last_waiter_cancels_the_call():
+    async def scenario():
+        flight, cancelled = Flight("test"), asyncio.Event()
+
+        async def fetch():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.create_task(flight.run("k", fetch))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return flight.stats()
+
+    stats = run(scenario())
+    assert stats["cancelled"] == 1 and stats["running"] == 0
+
+
+def test_new_caller_does_not_join_a_cancelled_call():
+    # отменённая задача ещё сворачивается (асинхронная уборка, как у httpx),
+    # а клиент уже повторил тот же запрос - он должен получить результат, а не CancelledError
+    async def scenario():
+        flight, attempts = Flight("test"), []
+
+        async def fetch():
+            attempts.append(1)
+            if len(attempts) == 1:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    await asyncio.sleep(0.05)
+                    raise
+            return "fresh"
+
+        first = asyncio.create_task(flight.run("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0) # первый ждущий ушёл, задача отменена, но ещё не завершилась
+        return await flight.run("k", fetch), attempts
+
+    result, attempts = run(scenario())
+    assert result == "fresh"
+    assert len(attempts) == 2
+
+
+def test_error_reaches_every_waiter():
+    async def scenario():
+        flight = Flight("test")
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream")
+
+        return await asyncio.gather(*(flight.run("k", fetch) for _ in range(3)), return_exceptions=True)
+
+    results = run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
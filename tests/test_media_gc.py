@@ -0,0 +1,46 @@
+import io
+import os
+import time
+
+import pytest
+
+from backend.tools.media.gc import (QUARANTINE_DIR, _quarantine, _scan)
+from backend.tools.media.storage import (MEDIA_ROOT, _ingest)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+@pytest.fixture(autouse=True)
+def media_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def stored(data: bytes, age_days: float) -> str:
+    rel, _ = _ingest(io.BytesIO(data), "photos")
+    old = time.time() - age_days * 86400
+    os.utime(MEDIA_ROOT / rel, (old, old))
+    return rel
+
+
+def test_unreferenced_old_file_goes_to_quarantine():
+    garbage_rel, kept_rel, fresh_rel = stored(PNG, 3), stored(PNG + b"1", 3), stored(PNG + b"2", 0)
+    garbage, report = _scan({kept_rel})
+    assert [rel for rel, _ in garbage] == [garbage_rel]
+    assert report["referenced"] == 1 and report["too_fresh"] == 1
+
+    moved, _, revived = _quarantine(garbage)
+    assert (moved, revived) == (1, 0)
+    assert (QUARANTINE_DIR / garbage_rel).exists() and not (MEDIA_ROOT / garbage_rel).exists()
+    assert (MEDIA_ROOT / fresh_rel).exists()
+
+
+def test_file_reuploaded_after_scan_is_not_quarantined():
+    rel = stored(PNG, 3)
+    garbage, _ = _scan(set())
+    assert [r for r, _ in garbage] == [rel]
+
+    _ingest(io.BytesIO(PNG), "photos") # тот же файл загрузили, commit с ссылкой ещё впереди
+    moved, _, revived = _quarantine(garbage)
+    assert (moved, revived) == (0, 1)
+    assert (MEDIA_ROOT / rel).exists()
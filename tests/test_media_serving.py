@@ -0,0 +1,28 @@
+import pytest
+
+from backend.tools.media.serving import (_accepted_encodings, _pick_encoding)
+
+BOTH = {"br": None, "gzip": None}
+
+
+def test_accept_encoding_is_parsed_into_q_values():
+    assert _accepted_encodings("gzip, br;q=0.5, *;q=0") == {"gzip": 1.0, "br": 0.5, "*": 0.0}
+    assert _accepted_encodings(" GZip ; Q=0.3 ,, deflate") == {"gzip": 0.3, "deflate": 1.0}
+    assert _accepted_encodings("br;q=abc") == {"br": 0.0}
+    assert _accepted_encodings("") == {}
+
+
+@pytest.mark.parametrize("header, available, expected", [
+    ("gzip, deflate, br", BOTH, "br"), # равные q - по нашему порядку
+    ("br;q=0, gzip", BOTH, "gzip"), # q=0 - запрет, а не "br" в строке
+    ("gzip;q=0.5, br;q=0.4", BOTH, "gzip"),
+    ("x-gzip", BOTH, None), # подстрока не считается
+    ("brotli", BOTH, None),
+    ("*", BOTH, "br"),
+    ("*;q=0.1, br;q=0", BOTH, "gzip"),
+    ("identity", BOTH, None),
+    ("", BOTH, None),
+    ("br", {"gzip": None}, None),
+])
+def test_pick_encoding(header, available, expected):
+    assert _pick_encoding(header, available) == expected
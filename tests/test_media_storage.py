@@ -0,0 +1,41 @@
+import io
+import os
+import time
+
+import pytest
+
+from backend.tools.media.storage import (MEDIA_ROOT, UploadRejected, _ingest, upload_stats)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+@pytest.fixture(autouse=True)
+def media_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # media/ и блокировка - относительные пути
+    return tmp_path
+
+
+def test_same_content_is_stored_once():
+    first, _ = _ingest(io.BytesIO(PNG), "photos")
+    deduplicated = upload_stats["deduplicated"]
+    second, _ = _ingest(io.BytesIO(PNG), "photos")
+    assert first == second and first.startswith("store/") and first.endswith(".png")
+    assert upload_stats["deduplicated"] == deduplicated + 1
+    assert list((MEDIA_ROOT / "tmp").iterdir()) == []
+
+
+def test_dedup_hit_refreshes_mtime():
+    # старый файл без ссылок переиспользован новой загрузкой - сборщик мусора не должен счесть его старым
+    rel, _ = _ingest(io.BytesIO(PNG), "photos")
+    old = time.time() - 10 * 86400
+    os.utime(MEDIA_ROOT / rel, (old, old))
+    _ingest(io.BytesIO(PNG), "photos")
+    assert time.time() - (MEDIA_ROOT / rel).stat().st_mtime < 60
+
+
+@pytest.mark.parametrize("data, status", [(b"not an image", "FT"), (b"", "FT"), (PNG + b"\x00" * (5 * 1024 * 1024), "TB")])
+def test_rejected_uploads_leave_nothing_behind(data, status):
+    with pytest.raises(UploadRejected) as rejected:
+        _ingest(io.BytesIO(data), "photos")
+    assert rejected.value.status == status
+    assert list((MEDIA_ROOT / "tmp").iterdir()) == []
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from backend.tools.media import variants
+from backend.tools.media.storage import (MEDIA_ROOT, MEDIA_URL)
+from backend.tools.media.variants import (load_variants, render_variants, thumb_url, variant_urls)
+
+pytestmark = pytest.mark.skipif(not variants.FORMATS, reason="нет Pillow")
+
+
+@pytest.fixture(autouse=True)
+def media_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    variants._ready.clear()
+    return tmp_path
+
+
+def _photo(name: str = "ab/photo.png") -> str:
+    from PIL import Image
+    path = MEDIA_ROOT / "store" / name
+    path.parent.mkdir(parents=True)
+    Image.new("RGB", (400, 300), "red").save(path)
+    return f"{MEDIA_URL}/store/{name}"
+
+
+def test_lookup_happens_only_in_load_variants(monkeypatch):
+    url = _photo()
+    assert asyncio.run(render_variants(url, "photos"))
+
+    # промах кэша - сразу оригинал, без stat() в event loop
+    with monkeypatch.context() as m:
+        m.setattr(variants, "_lookup", lambda *a: pytest.fail("stat в event loop"))
+        assert variant_urls(url, "photos") == {}
+        assert thumb_url(url) == url
+
+    asyncio.run(load_variants([(url, "photos"), (url, "photos"), (None, "photos")]))
+    found = variant_urls(url, "photos")
+    assert set(found) == {"96", "320"}
+    assert thumb_url(url) == found["96"]["webp"]
+    assert thumb_url(url).endswith("/variants/store/ab/photo.96.webp")
+
+
+def test_missing_variants_are_cached_as_empty():
+    url = _photo()
+    asyncio.run(load_variants([(url, "photos")]))
+    assert variant_urls(url, "photos") == {}
+    assert variants._ready.get(url) == {} # повторный load_variants не пойдёт в поток
+
+    assert asyncio.run(render_variants(url, "photos")) # после отрисовки кэш сброшен
+    asyncio.run(load_variants([(url, "photos")]))
+    assert set(variant_urls(url, "photos")) == {"96", "320"}
+
+
+def test_foreign_urls_have_no_variants():
+    asyncio.run(load_variants([("https://example.com/a.png", "photos"), ("", "photos")]))
+    assert variant_urls("https://example.com/a.png", "photos") == {}
+    assert thumb_url(None) is None
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.tools.pool import (BoundedPool, PoolBusy)
+
+
+def test_admission_rejects_above_workers_plus_queue():
+    pool = BoundedPool("test", workers=1, queue_limit=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.create_task(pool.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0) # обе задачи прошли допуск: одна в потоке, одна в очереди
+        assert pool.inflight == 2
+
+        with pytest.raises(PoolBusy):
+            await pool.run(lambda: None) # третья - сразу отказ, без ожидания
+        assert pool.rejected == 1
+
+        release.set()
+        assert await asyncio.gather(*running) == [True, True]
+        assert pool.inflight == 0
+        assert await pool.run(sum, (1, 2)) == 3 # место освободилось
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
+    assert pool.stats()["done"] == 3 and pool.stats()["rejected"] == 1
+
+
+def test_errors_free_the_slot():
+    pool = BoundedPool("test", workers=1, queue_limit=0)
+
+    def boom():
+        raise ValueError("boom")
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await pool.run(boom)
+        assert pool.inflight == 0
+        assert await pool.run(int, "7") == 7
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+
+def test_executor_is_lazy_and_recreated_after_shutdown():
+    pool = BoundedPool("test", workers=2, queue_limit=0)
+    assert pool._executor is None and pool.stats()["avg_ms"] is None
+    assert asyncio.run(pool.run(threading.current_thread)).name.startswith("test")
+    pool.shutdown()
+    assert pool._executor is None
+    assert asyncio.run(pool.run(abs, -1)) == 1
+    pool.shutdown()
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import date
+
+import httpx
+
+from backend.api import rzd_api
+from backend.tools import cache as cache_module
+
+
+def test_stop_background_cancels_late_lookups():
+    async def scenario():
+        finished = []
+
+        async def lookup():
+            try:
+                await asyncio.sleep(60)
+            finally:
+                finished.append(rzd_api.client.is_closed) # клиент ещё открыт, пока задача сворачивается
+
+        task = asyncio.create_task(lookup())
+        rzd_api._background.add(task)
+        task.add_done_callback(rzd_api._background.discard)
+        await asyncio.sleep(0)
+
+        await rzd_api.stop_background()
+        assert task.cancelled() and finished == [False]
+        assert not rzd_api._background
+        await rzd_api.stop_background() # пустой набор - тоже нормально
+
+    asyncio.run(scenario())
+
+
+def _route(*codes) -> rzd_api.TrainRoute:
+    n = len(codes)
+    return rzd_api.TrainRoute(
+        names=tuple(f"S{c}" for c in codes), codes=tuple(str(c) for c in codes), code_ints=codes,
+        ts_arr=("Н/Д",) * n, ts_dep=("Н/Д",) * n, stop_min=(0,) * n,
+    )
+
+
+def test_route_view_segment():
+    view = rzd_api._route_view("001А", _route(1, 2, 3, 4), "2", "4")
+    assert view["segment"] == [1, 3]
+    assert [stop["is_target"] for stop in view["stops"]] == [None, 0, None, 1]
+
+    assert rzd_api._route_view("001А", _route(1, 2, 3), "3", "1")["segment"] is None # едет в другую сторону
+    assert rzd_api._route_view("001А", _route(1, 2, 3), "2", "9")["segment"] is None
+    assert rzd_api._route_view("001А", _route(2, 1, 2, 3), "2", "3")["segment"] == [0, 3]
+    assert rzd_api._route_view("001А", rzd_api.EMPTY_ROUTE, "2", "3") == {"train": "001А", "stops": [], "segment": None}
+
+
+ROUTE_JSON = (
+    b'{"Routes": [{"RouteStops": ['
+    b'{"StationName": "A", "StationCode": "1", "DepartureTime": "10:00"},'
+    b'{"StationName": "B", "StationCode": "2", "ArrivalTime": "12:00"}]}]}'
+)
+
+
+def _fake_upstream(monkeypatch, responses):
+    calls = []
+
+    async def upstream(kind, method, **kwargs):
+        calls.append(kwargs["params"])
+        status, body = responses.pop(0)
+        return httpx.Response(status, content=body, request=httpx.Request(method, rzd_api.URLS[kind]))
+
+    monkeypatch.setattr(rzd_api, "_upstream", upstream)
+    return calls
+
+
+def test_failed_route_is_not_cached_for_cache_ttl(monkeypatch):
+    calls = _fake_upstream(monkeypatch, [(502, b""), (200, ROUTE_JSON)])
+    now = [1000.0]
+    monkeypatch.setattr(cache_module, "monotonic", lambda: now[0])
+
+    async def scenario():
+        assert await rzd_api._get_real_route("901А", "1", "2", "fallback", "P", "S") == "fallback"
+        # сразу после неудачи RZD не дёргаем
+        assert (await rzd_api._fetch_stops_data("901А", "1", "2", "P", "S"))["stops"] == []
+        assert len(calls) == 1
+
+        now[0] += rzd_api.ROUTE_RETRY + 1 # а через ROUTE_RETRY - спрашиваем снова
+        assert await rzd_api._get_real_route("901А", "1", "2", "fallback", "P", "S") == "A - B"
+        view = await rzd_api._fetch_stops_data("901А", "1", "2", "P", "S") # уже из кэша
+        assert view["segment"] == [0, 1]
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+    assert calls[0]["DepartureDate"] == f"{date.today().isoformat()}T00:00:00" # день из ключа кэша
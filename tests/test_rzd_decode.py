@@ -0,0 +1,51 @@
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+
+from backend.api.rzd_decode import (clock_seconds, decode_departed, decode_prices, roll_stop_times, train_base)
+from backend.tools.delays import DelayRecorder
+
+FIXTURE = Path(__file__).parent / "fixtures" / "departed.json"
+
+
+def test_departed_keeps_fact_fields():
+    # поля факта настраиваются в env - декодер не должен их выбрасывать
+    recorder = DelayRecorder()
+    trains = decode_departed(FIXTURE.read_bytes())
+    assert [recorder.observe(t, "2006004") for t in trains] == [True, True, True, False]
+
+
+def test_departed_unexpected_shape_is_empty():
+    assert decode_departed(b'{"error": "busy"}') == []
+    assert decode_departed(None) == []
+
+
+def test_departed_train_base():
+    bases = [train_base(t) for t in decode_departed(FIXTURE.read_bytes())]
+    assert bases[0]["fallback_route"] == "МОСКВА ОКТЯБРЬСКАЯ - САНКТ-ПЕТЕРБУРГ-ГЛАВН."
+    assert bases[2]["type"] == "пригородный"
+
+
+def test_prices_schema_mismatch_falls_back_to_json():
+    info, trains = decode_prices(b'{"Trains": {"not": "a list"}, "OriginStationName": "A"}')
+    assert info["origin"] == "A"
+
+
+@pytest.mark.parametrize("value, seconds", [("7:05", 25500), ("07:05:30", 25530), ("", None), (None, None)])
+def test_clock_seconds(value, seconds):
+    assert clock_seconds(value) == seconds
+
+
+def test_clock_seconds_rejects_garbage():
+    with pytest.raises(ValueError):
+        clock_seconds("25:00")
+
+
+def test_roll_stop_times_across_midnight():
+    times = roll_stop_times([(None, "23:50"), ("23:58", "00:03"), ("01:10", None)], date(2026, 1, 1))
+    assert times == [
+        (None, datetime(2026, 1, 1, 23, 50)),
+        (datetime(2026, 1, 1, 23, 58), datetime(2026, 1, 2, 0, 3)), # стоянка через полночь
+        (datetime(2026, 1, 2, 1, 10), None),
+    ]